@@ -0,0 +1,409 @@
+# -*- coding: utf-8 -*-
+"""
+Banc d'essai de generateur_horaire_v2.py sur des flux synthétiques façon Henallux.
+
+Génère un dossier de mocks ({"horaire": {"ICAL": "<flux JSON>"}}, un fichier par salle,
+créneaux de 10 minutes avec dtstart/dtend/location/summary;language=fr) puis mesure :
+- `cli`    : le script complet via --mock-dir (sous-processus, --metrics-out);
+- `inproc` : les fonctions du module appelées directement (fetch_for_salle, room_events_by_date,
+             write_xml), avec le détail par étape;
+- `ical`   : micro-banc des horodatages, parse_dt_ical d'origine + strftime contre ical_local_minutes;
+- `merge`  : micro-banc de la fusion (--merge-slots créneaux), dicts d'origine contre Event, mémoire comprise.
+Rapporte le débit (créneaux/s), la latence par étape et le pic de RSS; les résultats sont
+enregistrés en JSON pour comparer les versions (--compare).
+
+Exemples :
+    python benchmark_horaire.py --rooms 500 --weeks 16 --label avant
+    python benchmark_horaire.py --rooms 500 --weeks 16 --label apres --compare bench_results/avant-both-....json
+    python benchmark_horaire.py --mode ical --rooms 200 --weeks 4
+    python benchmark_horaire.py --mode merge --merge-slots 20000
+Compatible Python 3.8+.
+"""
+import argparse
+import io
+import json
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+HERE = Path(__file__).resolve().parent
+GENERATOR = HERE / "generateur_horaire_v2.py"
+sys.path.insert(0, str(HERE))
+import generateur_horaire_v2 as gh  # noqa: E402
+
+DEFAULT_START = date(2026, 9, 14)  # un lundi : résultats reproductibles d'une exécution à l'autre
+
+_TEACHERS = ["DARTEVELLE Jennifer", "COTON Michel", "COLLIN Olivier", "LIBERATORE Caroline",
+             "MARTIN Luc", "DUBOIS Anne", "LAMBERT Marc", "SIMON Claire"]
+_COURSES = ["English", "Physique", "Mise en forme et fabrication numérique", "Production et application élec",
+            "Prévention et protection", "Mathématiques", "Thermodynamique", "Automatisme", "Chimie", "Dessin technique"]
+_GROUPS = ["IV-MSIIA-1M", "IV-MSIIA-2M", "IV-MSIIE-1M", "IV-MSIIE-2M", "IV-TSI-1T", "IV-TSI-2T"]
+
+def room_names(n: int) -> List[str]:
+    return [f"IV-B{i // 100:01d}{i % 100:02d}" for i in range(n)]
+
+def synthetic_feed(room: str, start: date, days: int, slots_per_day: int,
+                   rng: random.Random, dup_rate: float = 0.05) -> List[Dict[str, str]]:
+    """Créneaux de 10 minutes (horodatages UTC 'Z') d'une salle, regroupés en cours de 6 à 12
+    créneaux entre 8 h et 18 h, week-ends exclus; `dup_rate` = part de créneaux dupliqués."""
+    feed: List[Dict[str, str]] = []
+    for d in range(days):
+        day = start + timedelta(days=d)
+        if day.weekday() >= 5:
+            continue
+        left = slots_per_day
+        minute = 8 * 60 + rng.choice((0, 10, 20))
+        while left > 0 and minute < 18 * 60:
+            n = min(left, rng.randint(6, 12))
+            summary = (f"{rng.choice(_COURSES)} - {rng.choice(_TEACHERS)} - "
+                       f"{rng.choice(_GROUPS)}, {rng.choice(_GROUPS)} - {rng.randint(5, 40)}")
+            for k in range(n):
+                t = datetime(day.year, day.month, day.day, tzinfo=timezone.utc) + timedelta(minutes=minute + 10 * k - 120)
+                item = {
+                    "dtstart": t.strftime("%Y%m%dT%H%M%SZ"),
+                    "dtend": (t + timedelta(minutes=10)).strftime("%Y%m%dT%H%M%SZ"),
+                    "location": room,
+                    "summary;language=fr": summary,
+                    "uid": f"{room}-{d}-{minute + 10 * k}",
+                }
+                feed.append(item)
+                if rng.random() < dup_rate:
+                    feed.append(dict(item))
+            left -= n
+            minute += 10 * n + rng.choice((0, 10, 20, 60))
+    return feed
+
+BULK_MOCK = "bulk.json"
+
+def write_mock_dir(directory: Path, rooms: List[str], start: date, days: int,
+                   slots_per_day: int, seed: int = 0, bulk: bool = False) -> int:
+    """Écrit un mock par salle + salles.ini dans `directory`; retourne le nombre de créneaux.
+    `bulk` : écrit aussi BULK_MOCK, flux unique de toutes les salles trié par dtstart (--bulk)."""
+    directory.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(seed)
+    total = 0
+    site: List[Dict[str, str]] = []
+    for room in rooms:
+        feed = synthetic_feed(room, start, days, slots_per_day, rng)
+        total += len(feed)
+        if bulk:
+            site.extend(feed)
+        payload = {"horaire": {"ICAL": json.dumps({"feed": feed}, ensure_ascii=False)}}
+        (directory / f"{room}.json").write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+    if bulk:
+        site.sort(key=lambda it: it["dtstart"])
+        payload = {"horaire": {"ICAL": json.dumps({"feed": site}, ensure_ascii=False)}}
+        (directory / BULK_MOCK).write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+    ini = "".join(f"salle{i + 1:03d}={room}\n" for i, room in enumerate(rooms))
+    (directory / "salles.ini").write_text(ini, encoding="utf-8")
+    return total
+
+def run_cli(mock_dir: Path, start: date, days: int, extra: List[str], bulk: bool = False) -> Dict[str, Any]:
+    """Exécute le script complet dans un sous-processus (démarrage de Python compris);
+    `bulk` : flux unique BULK_MOCK traité par --bulk au lieu d'un mock par salle."""
+    source = ["--mock", str(mock_dir / BULK_MOCK), "--bulk"] if bulk else ["--mock-dir", str(mock_dir)]
+    with tempfile.TemporaryDirectory() as tmp:
+        out = Path(tmp) / "out.xml"
+        metrics_path = Path(tmp) / "metrics.json"
+        cmd = [sys.executable, str(GENERATOR), "--salles", str(mock_dir / "salles.ini")] + source + [
+               "--out", str(out), "--start", start.strftime("%Y%m%d"),
+               "--days", str(days), "--metrics-out", str(metrics_path)] + extra
+        t0 = time.perf_counter()
+        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL)
+        wall = time.perf_counter() - t0
+        metrics = json.loads(metrics_path.read_text(encoding="utf-8"))
+        return {"wall_s": wall, "peak_rss": metrics.get("peak_rss"), "out_bytes": out.stat().st_size,
+                "stages": {k: v["wall_s"] for k, v in metrics["stages"].items()}}
+
+def run_inproc(mock_dir: Path, rooms: List[str], start: date, days: int,
+               shift_hours: int = -2, merge_gap: int = 0, bulk: bool = False) -> Dict[str, Any]:
+    """Appelle directement les fonctions du module, salle par salle (ou via BulkFeed), comme main()."""
+    gh.ical_local_minutes.cache_clear()
+    metrics = gh.Metrics(rooms)
+    end = start + timedelta(days=days - 1)
+    buckets = gh.DayBuckets(start, days)
+    t0 = time.perf_counter()
+    shared = None
+    if bulk:
+        data = gh.fetch_for_salle(None, "", str(mock_dir / BULK_MOCK), None, metrics=metrics)
+        shared = gh.BulkFeed(data, True, start, end, shift_hours, merge_gap, metrics)
+    for room in rooms:
+        if shared is not None:
+            by_day = shared.room(room)
+        else:
+            data = gh.fetch_for_salle(None, room, None, str(mock_dir), metrics=metrics)
+            by_day = gh.room_events_by_date(data, room, start, end, shift_hours, merge_gap,
+                                            metrics=metrics, salle=room)
+        for lst in by_day.values():
+            buckets.extend(lst)
+    t1 = time.perf_counter()
+    buf = io.BytesIO()
+    gh.write_xml(buf, buckets)
+    metrics.add("write_xml", time.perf_counter() - t1, nbytes=buf.tell())
+    wall = time.perf_counter() - t0
+    return {"wall_s": wall, "peak_rss": gh.peak_rss_bytes(), "out_bytes": buf.tell(),
+            "stages": {k: v.wall_s for k, v in metrics.stages.items()},
+            "events_out": metrics.stages["merge"].items_out if "merge" in metrics.stages else 0}
+
+# ---- Micro-bancs (--mode ical / merge) : version de référence (avant optimisation) contre version actuelle
+def reference_parse_dt_ical(dt_str: Optional[str], tz: Optional[Any]) -> Optional[datetime]:
+    """parse_dt_ical d'origine : datetime complet par horodatage, converti vers Europe/Brussels si 'Z'."""
+    if not dt_str:
+        return None
+    s = dt_str.strip()
+    zulu = s.endswith("Z")
+    if zulu:
+        s = s[:-1]
+    if "T" not in s or len(s) < 13:
+        return None
+    date_part, time_part = s.split("T", 1)
+    try:
+        year = int(date_part[0:4]); month = int(date_part[4:6]); day = int(date_part[6:8])
+        hour = int(time_part[0:2]); minute = int(time_part[2:4])
+        dt = datetime(year, month, day, hour, minute)
+        if zulu:
+            dt = dt.replace(tzinfo=timezone.utc)
+            if tz is not None:
+                dt = dt.astimezone(tz)
+        elif tz is not None:
+            dt = dt.replace(tzinfo=tz)
+        return dt
+    except Exception:
+        return None
+
+def _reference_minutes(hhmm: str) -> int:
+    return int(hhmm[:2]) * 60 + int(hhmm[2:4])
+
+def reference_merge(day_events: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """merge_contiguous_events d'origine : dicts de chaînes, fusion si TimeEND == TimeSTART suivant."""
+    if not day_events:
+        return []
+    day_events = sorted(day_events, key=lambda e: (e.get("LOCATION", ""), e.get("SUMMARY", ""),
+                                                   e.get("TimeSTART", ""), e.get("TimeEND", "")))
+    merged: List[Dict[str, str]] = []
+    cur: Optional[Dict[str, str]] = None
+    for e in day_events:
+        if cur is None:
+            cur = dict(e)
+            continue
+        if e.get("LOCATION", "") == cur.get("LOCATION", "") and e.get("SUMMARY", "") == cur.get("SUMMARY", ""):
+            end_cur = _reference_minutes(cur.get("TimeEND", "0000"))
+            if _reference_minutes(e.get("TimeSTART", "0000")) == end_cur:
+                end_e = _reference_minutes(e.get("TimeEND", "0000"))
+                if end_e > end_cur:
+                    cur["TimeEND"] = f"{end_e // 60 % 24:02d}{end_e % 60:02d}"
+                continue
+        merged.append(cur)
+        cur = dict(e)
+    merged.append(cur)
+    return merged
+
+def _timed(fn: Callable[[], Any], repeat: int) -> Tuple[float, Any]:
+    """Meilleur temps de `repeat` appels de fn() et le résultat du dernier."""
+    best, out = float("inf"), None
+    for _ in range(max(1, repeat)):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+def run_ical(feed: List[Dict[str, str]], repeat: int, shift_hours: int = -2) -> Dict[str, Any]:
+    """Horodatages dtstart/dtend du flux -> (jour, heure locale) : parse_dt_ical + décalage + strftime
+    (référence) contre ical_local_minutes mémoïsé + ordinal_to_datekey (actuel, cache vidé à chaque tour)."""
+    stamps = [it[k] for it in feed for k in ("dtstart", "dtend")]
+    tz = gh.local_tz()
+    shift = timedelta(hours=shift_hours)
+
+    def reference() -> List[Tuple[str, str]]:
+        out = []
+        for raw in stamps:
+            dt = reference_parse_dt_ical(raw, tz) + shift
+            out.append((dt.strftime("%Y%m%d"), dt.strftime("%H%M")))
+        return out
+
+    def current() -> List[Tuple[str, str]]:
+        gh.ical_local_minutes.cache_clear()
+        gh.ordinal_to_datekey.cache_clear()
+        out = []
+        for raw in stamps:
+            day, minutes = gh.ical_local_minutes(raw, shift_hours)
+            out.append((gh.ordinal_to_datekey(day), f"{minutes // 60:02d}{minutes % 60:02d}"))
+        return out
+
+    lo, hi = min(stamps)[:8], max(stamps)[:8]
+    margin = gh.window_margin(shift_hours)
+    gh._UTC_OFFSETS.prepare(datetime.strptime(lo, "%Y%m%d").date() - margin,
+                            datetime.strptime(hi, "%Y%m%d").date() + margin)
+    t_ref, ref = _timed(reference, repeat)
+    t_cur, cur = _timed(current, repeat)
+    if ref != cur:
+        raise SystemExit("[ical] résultats différents entre la référence et la version actuelle")
+    return {"n": len(stamps), "wall_s": t_cur, "stages": {"reference": t_ref, "actuel": t_cur}}
+
+def _slot_dicts(evts: List[gh.Event]) -> List[Dict[str, str]]:
+    return [{"LOCATION": e.location, "TimeSTART": f"{e.start // 60:02d}{e.start % 60:02d}",
+             "TimeEND": f"{e.end // 60:02d}{e.end % 60:02d}", "SUMMARY": e.summary,
+             "DATEKEY": gh.ordinal_to_datekey(e.day)} for e in evts]
+
+def _list_bytes(build: Callable[[], List[Any]]) -> Tuple[int, List[Any]]:
+    """Mémoire allouée (tracemalloc) par la liste construite par build()."""
+    tracemalloc.start()
+    try:
+        lst = build()
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return size, lst
+
+MERGE_GROUP = 50  # créneaux par cours dans run_merge : au plus 50 x 20 minutes, sans passer minuit
+
+def run_merge(n_slots: int, repeat: int, seed: int = 0) -> Dict[str, Any]:
+    """Fusion de `n_slots` créneaux de 10 minutes d'une même salle, par cours de MERGE_GROUP créneaux
+    contigus ou séparés de 10 minutes, mélangés : dicts de chaînes + reference_merge contre
+    Event + merge_contiguous_events, et mémoire des deux représentations.
+    Sans chevauchement ni doublon, les deux versions fusionnent pareil."""
+    rng = random.Random(seed)
+    day = DEFAULT_START.toordinal()
+    raw: List[Tuple[str, int]] = []
+    for g in range(-(-n_slots // MERGE_GROUP)):
+        summary = f"{rng.choice(_COURSES)} - {rng.choice(_TEACHERS)} - {g}"
+        minute = 8 * 60
+        for _ in range(min(MERGE_GROUP, n_slots - len(raw))):
+            raw.append((summary, minute))
+            minute += 10 + rng.choice((0, 0, 0, 10))
+    rng.shuffle(raw)
+    mem_events, events = _list_bytes(lambda: [gh.Event(day, "IV-B001", sys.intern(summary), m, m + 10)
+                                              for summary, m in raw])
+    mem_dicts, dicts = _list_bytes(lambda: _slot_dicts(events))
+    t_ref, ref = _timed(lambda: reference_merge(dicts), repeat)
+    t_cur, cur = _timed(lambda: gh.merge_contiguous_events(events), repeat)
+    if len(ref) != len(cur):
+        raise SystemExit(f"[merge] {len(ref)} créneaux fusionnés (référence) contre {len(cur)} (actuel)")
+    return {"n": len(events), "merged": len(cur), "wall_s": t_cur,
+            "stages": {"reference": t_ref, "actuel": t_cur},
+            "memory": {"reference": mem_dicts, "actuel": mem_events}}
+
+def best_of(runs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Meilleure exécution (temps mural minimal) : la moins perturbée par le reste du système."""
+    return min(runs, key=lambda r: r["wall_s"])
+
+def compare(current: Dict[str, Any], previous: Dict[str, Any]) -> str:
+    lines = [f"comparaison avec {previous.get('label')} ({previous.get('timestamp')})",
+             f"{'mesure':<28} {'avant':>10} {'après':>10} {'ratio':>7}"]
+    for mode in ("cli", "inproc", "ical", "merge"):
+        cur, prev = current.get(mode), previous.get(mode)
+        if not cur or not prev:
+            continue
+        keys = [("wall_s", "wall_s")] + [(f"stage {k}", k) for k in cur["stages"] if k in prev.get("stages", {})]
+        for label, key in keys:
+            a = prev[key] if key == "wall_s" else prev["stages"][key]
+            b = cur[key] if key == "wall_s" else cur["stages"][key]
+            ratio = f"{b / a:.2f}" if a else "-"
+            lines.append(f"{mode + ' ' + label:<28} {a:>10.3f} {b:>10.3f} {ratio:>7}")
+    return "\n".join(lines)
+
+def run_feeds(args: argparse.Namespace, rooms: List[str], days: int, result: Dict[str, Any]) -> None:
+    """Modes cli / inproc / both : mocks écrits sur disque puis générateur mesuré de bout en bout."""
+    tmp = None
+    if args.mock_dir:
+        mock_dir = Path(args.mock_dir)
+    else:
+        tmp = tempfile.TemporaryDirectory()
+        mock_dir = Path(tmp.name)
+    try:
+        t0 = time.perf_counter()
+        slots = write_mock_dir(mock_dir, rooms, args.start, days, args.slots, args.seed, bulk=args.bulk)
+        print(f"[gen] {len(rooms)} salles x {days} jours : {slots} créneaux en {time.perf_counter() - t0:.1f} s")
+        result["slots_in"] = slots
+        if args.mode in ("inproc", "both"):
+            run = best_of([run_inproc(mock_dir, rooms, args.start, days, bulk=args.bulk) for _ in range(max(1, args.repeat))])
+            run["events_per_s"] = slots / run["wall_s"]
+            result["inproc"] = run
+        if args.mode in ("cli", "both"):
+            extra = args.cli_args.split()
+            run = best_of([run_cli(mock_dir, args.start, days, extra, args.bulk) for _ in range(max(1, args.repeat))])
+            run["events_per_s"] = slots / run["wall_s"]
+            result["cli"] = run
+    finally:
+        if tmp is not None:
+            tmp.cleanup()
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Banc d'essai de generateur_horaire_v2.py sur des flux synthétiques.")
+    p.add_argument("--rooms", type=int, default=100, help="Nombre de salles (défaut: 100).")
+    p.add_argument("--weeks", type=int, default=2, help="Nombre de semaines de flux et de fenêtre (défaut: 2).")
+    p.add_argument("--slots", type=int, default=40, help="Créneaux de 10 minutes par salle et par jour ouvré (défaut: 40).")
+    p.add_argument("--start", type=gh.parse_start_date, default=DEFAULT_START, help="Premier jour YYYYMMDD.")
+    p.add_argument("--seed", type=int, default=0, help="Graine du générateur (défaut: 0).")
+    p.add_argument("--repeat", type=int, default=3, help="Répétitions par mode, la meilleure est gardée (défaut: 3).")
+    p.add_argument("--mode", choices=["cli", "inproc", "both", "ical", "merge"], default="both",
+                   help="Mode(s) mesuré(s) (défaut: both); ical et merge : micro-bancs référence/actuel.")
+    p.add_argument("--merge-slots", type=int, default=20000,
+                   help="--mode merge : nombre de créneaux d'une salle à fusionner (défaut: 20000).")
+    p.add_argument("--bulk", action="store_true",
+                   help=f"Mesurer --bulk sur un flux unique de toutes les salles ({BULK_MOCK}).")
+    p.add_argument("--mock-dir", help="Dossier où écrire les mocks (défaut: dossier temporaire supprimé à la fin).")
+    p.add_argument("--cli-args", default="", help="Options supplémentaires passées au script en mode cli.")
+    p.add_argument("--results-dir", default=str(HERE / "bench_results"), help="Dossier des résultats JSON.")
+    p.add_argument("--label", default="", help="Nom de la version mesurée (préfixe du fichier de résultats).")
+    p.add_argument("--compare", help="Fichier de résultats précédent à comparer.")
+    args = p.parse_args()
+
+    rooms = room_names(args.rooms)
+    days = args.weeks * 7
+    result: Dict[str, Any] = {
+        "label": args.label, "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0], "platform": platform.platform(),
+        "params": {"rooms": args.rooms, "weeks": args.weeks, "slots": args.slots,
+                   "start": args.start.isoformat(), "seed": args.seed, "cli_args": args.cli_args,
+                   "bulk": args.bulk, "merge_slots": args.merge_slots},
+    }
+    if args.mode == "ical":
+        rng = random.Random(args.seed)
+        feed = [it for room in rooms for it in synthetic_feed(room, args.start, days, args.slots, rng)]
+        result["ical"] = run_ical(feed, args.repeat)
+    elif args.mode == "merge":
+        result["merge"] = run_merge(args.merge_slots, args.repeat, args.seed)
+    else:
+        run_feeds(args, rooms, days, result)
+
+    for mode in ("ical", "merge"):
+        run = result.get(mode)
+        if not run:
+            continue
+        ref, cur = run["stages"]["reference"], run["stages"]["actuel"]
+        print(f"[{mode}] {run['n']} éléments : référence {ref * 1000:.1f} ms, actuel {cur * 1000:.1f} ms "
+              f"({ref / cur:.1f}x)")
+        if "memory" in run:
+            mem = run["memory"]
+            print(f"    mémoire     référence {mem['reference'] / 2**20:.1f} Mo, actuel {mem['actuel'] / 2**20:.1f} Mo "
+                  f"({mem['actuel'] / run['n']:.0f} octets/créneau)")
+    for mode in ("inproc", "cli"):
+        run = result.get(mode)
+        if not run:
+            continue
+        rss = "-" if run["peak_rss"] is None else f"{run['peak_rss'] / 2**20:.1f} Mo"
+        print(f"[{mode}] {run['wall_s']:.3f} s, {run['events_per_s']:,.0f} créneaux/s, pic RSS {rss}")
+        for stage, secs in run["stages"].items():
+            print(f"    {stage:<12} {secs * 1000:10.1f} ms")
+
+    results_dir = Path(args.results_dir)
+    results_dir.mkdir(parents=True, exist_ok=True)
+    # mode et microsecondes dans le nom : deux exécutions dans la même seconde ne s'écrasent pas
+    name = f"{args.label + '-' if args.label else ''}{args.mode}-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}.json"
+    out_path = results_dir / name
+    out_path.write_text(json.dumps(result, ensure_ascii=False, indent=1), encoding="utf-8")
+    print(f"[bench] résultats -> {out_path}")
+    if args.compare:
+        print(compare(result, json.loads(Path(args.compare).read_text(encoding="utf-8"))))
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
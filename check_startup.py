@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+Contrôle du démarrage à froid de generateur_horaire_v2.py (python -X importtime).
+
+Vérifie, dans des interpréteurs neufs :
+- `import`  : le temps d'import du module (cumulé, meilleur de --repeat) reste sous --budget-ms,
+              sans charger les modules réservés aux chemins qui s'en servent (LAZY);
+- `mock`    : une génération --mock-dir sur des flux synthétiques n'importe ni la pile HTTP(S),
+              ni multiprocessing, ni ElementTree (FORBIDDEN_MOCK);
+- `gui`     : l'ouverture de l'interface n'importe pas le générateur avant le premier clic.
+Code de sortie 1 si une vérification échoue, pour servir de contrôle de non-régression.
+
+Exemple :
+    python check_startup.py --budget-ms 60 --repeat 5
+Compatible Python 3.8+.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+HERE = Path(__file__).resolve().parent
+GENERATOR = HERE / "generateur_horaire_v2.py"
+GUI_SRC = HERE / "generateur_horaire_gui" / "src"
+
+DEFAULT_BUDGET_MS = 60.0
+# importés à la demande seulement : jamais par un simple import du module
+LAZY = ("argparse", "zoneinfo", "hashlib", "random", "concurrent.futures", "multiprocessing",
+        "http.client", "ssl", "socket", "xml.etree.ElementTree", "requests")
+# jamais importés par une génération depuis des mocks
+FORBIDDEN_MOCK = ("requests", "xml.etree.ElementTree", "http.client", "ssl", "multiprocessing",
+                  "concurrent.futures.process")
+
+def import_times(args: List[str], cwd: Path = HERE) -> Tuple[Dict[str, Tuple[int, int]], int]:
+    """Lance `python -X importtime <args>` : {module: (propre µs, cumulé µs)} et code de sortie."""
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="")
+    proc = subprocess.run([sys.executable, "-X", "importtime"] + args, cwd=str(cwd), env=env,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    times: Dict[str, Tuple[int, int]] = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumul_us, name = (x.strip() for x in line[len("import time:"):].split("|", 2))
+        if self_us.isdigit():
+            times.setdefault(name, (int(self_us), int(cumul_us)))
+    return times, proc.returncode
+
+def measure_import(repeat: int) -> Tuple[float, Dict[str, Tuple[int, int]]]:
+    """Import du module dans `repeat` interpréteurs neufs : temps cumulé (ms) et détail du meilleur."""
+    runs = [import_times(["-c", "import generateur_horaire_v2"])[0] for _ in range(max(1, repeat))]
+    best = min(runs, key=lambda t: t.get("generateur_horaire_v2", (0, 0))[1])
+    return best.get("generateur_horaire_v2", (0, 0))[1] / 1000, best
+
+def check_import(budget_ms: float, repeat: int) -> bool:
+    total_ms, best = measure_import(repeat)
+    ok = total_ms <= budget_ms
+    print(f"[import] {total_ms:.1f} ms (budget {budget_ms:.0f} ms) {'OK' if ok else 'DÉPASSÉ'}")
+    for name, (self_us, cumul_us) in sorted(best.items(), key=lambda kv: -kv[1][0])[:8]:
+        print(f"    {name:<28} {self_us / 1000:7.1f} ms propre {cumul_us / 1000:8.1f} ms cumulé")
+    loaded = [m for m in LAZY if m in best]
+    if loaded:
+        print(f"[import] modules chargés trop tôt : {', '.join(loaded)}")
+    return ok and not loaded
+
+def check_mock_run() -> bool:
+    import benchmark_horaire as bench
+    with tempfile.TemporaryDirectory() as tmp:
+        mocks = Path(tmp) / "mocks"
+        mocks.mkdir()
+        bench.write_mock_dir(mocks, bench.room_names(5), bench.DEFAULT_START, 7, 20, 0)
+        start = bench.DEFAULT_START
+        times, code = import_times([str(GENERATOR), "--salles", str(mocks / "salles.ini"),
+                                    "--mock-dir", str(mocks), "--out", str(Path(tmp) / "out.xml"),
+                                    "--start", start.strftime("%Y%m%d"), "--days", "7"])
+        end = start + timedelta(days=6)
+    bad = [m for m in FORBIDDEN_MOCK if m in times]
+    ok = code == 0 and not bad
+    print(f"[mock] génération {start:%d/%m}-{end:%d/%m}, code {code}, {len(times)} modules importés "
+          f"{'OK' if ok else 'ÉCHEC'}")
+    if bad:
+        print(f"[mock] modules inutiles importés : {', '.join(bad)}")
+    return ok
+
+def check_gui() -> bool:
+    if not GUI_SRC.is_dir():
+        return True
+    times, code = import_times(["-c", "import generation, main, gui"], cwd=GUI_SRC)
+    if code != 0:
+        print("[gui] import impossible (tkinter absent ?), vérification ignorée")
+        return True
+    bad = [m for m in ("generateur_horaire_v2", "subprocess") if m in times]
+    print(f"[gui] ouverture : {'OK' if not bad else 'importe ' + ', '.join(bad)}")
+    return not bad
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Contrôle du temps de démarrage de generateur_horaire_v2.py.")
+    p.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS,
+                   help=f"Temps d'import maximal du module en ms (défaut: {DEFAULT_BUDGET_MS:.0f}).")
+    p.add_argument("--repeat", type=int, default=5, help="Imports mesurés, le meilleur est gardé (défaut: 5).")
+    args = p.parse_args()
+    results = [check_import(args.budget_ms, args.repeat), check_mock_run(), check_gui()]
+    return 0 if all(results) else 1
+
+if __name__ == "__main__":
+    raise SystemExit(main())
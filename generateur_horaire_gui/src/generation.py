@@ -0,0 +1,141 @@
+import queue
+import threading
+import time
+from tkinter import Frame, Label, Button
+from tkinter import ttk
+
+from utils import load_generator
+
+STAGES = ("fetch", "decode_api", "ical_decode", "normalize", "merge", "snapshot_in", "write_xml")
+
+class GenerationJob:
+    """Une génération lancée en arrière-plan : generateur_horaire_v2.main(argv, hooks) tourne
+    dans un thread, la progression arrive dans la file `events` :
+    ("room", salle, n_faites, n_total) puis ("done", code, message) (code None = annulée;
+    code 0 avec un message = XML produit avec des salles en repli)."""
+    def __init__(self, argv):
+        gen = load_generator()
+        self.events = queue.Queue()
+        self.started = time.monotonic()
+        job = self
+
+        class Hooks(gen.RunHooks):
+            def room_done(self, salle, done, total):
+                job.events.put(("room", salle, done, total))
+
+        self.hooks = Hooks()
+        self.thread = threading.Thread(target=self._run, args=(gen, list(argv)), daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def cancel(self):
+        self.hooks.cancel.set()
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def stage_timings(self):
+        """Temps cumulé (s) par étape, lisible pendant l'exécution."""
+        metrics = self.hooks.metrics
+        if metrics is None:
+            return {}
+        return {name: st["wall_s"] for name, st in metrics.as_dict()["stages"].items()}
+
+    def _run(self, gen, argv):
+        try:
+            code, message = gen.main(argv, self.hooks), ""
+            if code == gen.EXIT_DEGRADED:
+                code, message = 0, "XML produit, salle(s) périmée(s) ou absente(s) (voir la console)"
+        except gen.GenerationCancelled:
+            code, message = None, "Génération annulée"
+        except SystemExit as e:
+            if isinstance(e.code, str):  # message d'erreur du générateur
+                code, message = 1, e.code
+            else:  # argparse : usage et détail de l'erreur sur la console
+                code, message = e.code or 1, "Paramètres invalides (voir la console)"
+        except Exception as e:
+            code, message = 1, f"{type(e).__name__}: {e}"
+        self.events.put(("done", code, message))
+
+class ProgressPanel(Frame):
+    """Barre de progression par salle, temps écoulé, temps par étape et bouton Annuler.
+    start(argv, on_done) lance un GenerationJob; la file est relue toutes les 100 ms par la boucle Tk,
+    on_done(code, message) est appelé à la fin (depuis le thread Tk)."""
+    POLL_MS = 100
+
+    def __init__(self, master, **kwargs):
+        super().__init__(master, **kwargs)
+        self.job = None
+        self.on_done = None
+
+        self.bar = ttk.Progressbar(self, orient="horizontal", length=360, mode="determinate")
+        self.bar.grid(row=0, column=0, columnspan=2, sticky="we")
+
+        self.status_label = Label(self, text="Prêt", anchor="w")
+        self.status_label.grid(row=1, column=0, sticky="w")
+
+        self.elapsed_label = Label(self, text="", anchor="e")
+        self.elapsed_label.grid(row=1, column=1, sticky="e")
+
+        self.stages_label = Label(self, text="", justify="left", anchor="w", font=("Courier", 9))
+        self.stages_label.grid(row=2, column=0, columnspan=2, sticky="w")
+
+        self.cancel_button = Button(self, text="Annuler", command=self.cancel, state="disabled")
+        self.cancel_button.grid(row=3, column=0, columnspan=2)
+
+    @property
+    def running(self):
+        return self.job is not None
+
+    def start(self, argv, on_done=None):
+        if self.running:
+            return
+        self.job = GenerationJob(argv)
+        self.on_done = on_done
+        self.bar.configure(value=0, maximum=1)
+        self.status_label.configure(text="Récupération des salles…")
+        self.stages_label.configure(text="")
+        self.cancel_button.configure(state="normal")
+        self.job.start()
+        self.after(self.POLL_MS, self._poll)
+
+    def cancel(self):
+        if self.running:
+            self.job.cancel()
+            self.status_label.configure(text="Annulation…")
+            self.cancel_button.configure(state="disabled")
+
+    def _poll(self):
+        job = self.job
+        finished = None
+        try:
+            while True:
+                event = job.events.get_nowait()
+                if event[0] == "room":
+                    _, salle, done, total = event
+                    self.bar.configure(maximum=total, value=done)
+                    if not job.hooks.cancel.is_set():
+                        self.status_label.configure(text=f"{done}/{total} {salle}")
+                else:
+                    finished = event
+        except queue.Empty:
+            pass
+        self.elapsed_label.configure(text=f"{job.elapsed():.1f} s")
+        timings = job.stage_timings()
+        names = [n for n in STAGES if n in timings] + sorted(set(timings) - set(STAGES))
+        self.stages_label.configure(text="\n".join(f"{n:<12} {timings[n]:8.3f} s" for n in names))
+        if finished is None:
+            self.after(self.POLL_MS, self._poll)
+            return
+        _, code, message = finished
+        self.job = None
+        self.cancel_button.configure(state="disabled")
+        if code is None:
+            self.status_label.configure(text=message)
+        elif code == 0:
+            self.status_label.configure(text=f"Terminé ({job.elapsed():.1f} s)" + (f" - {message}" if message else ""))
+        else:
+            self.status_label.configure(text=f"Erreur : {message}" if message else f"Erreur (code {code})")
+        if self.on_done is not None:
+            self.on_done(code, message)
@@ -1,5 +1,7 @@
 from tkinter import Tk, Label, Entry, Button, Checkbutton, IntVar, StringVar, filedialog, messagebox
 
+from generation import ProgressPanel
+
 class ConfigGUI:
     def __init__(self, master):
         self.master = master
@@ -55,6 +57,9 @@ class ConfigGUI:
         self.generate_button = Button(master, text="Générer XML", command=self.generate_xml)
         self.generate_button.grid(row=7, columnspan=3)
 
+        self.progress = ProgressPanel(master)
+        self.progress.grid(row=8, columnspan=3, sticky="we", padx=5, pady=5)
+
     def browse_salles(self):
         filename = filedialog.askopenfilename(filetypes=[("INI files", "*.ini")])
         if filename:
@@ -86,10 +91,33 @@ class ConfigGUI:
             messagebox.showerror("Erreur", "Veuillez remplir tous les champs obligatoires.")
             return
 
-        # Here you would call the main function from generateur_horaire_v2.py with the collected parameters
-        # For example: main(salles, output, api_url, mock_file, include_empty_days, no_filter_location, shift_hours)
-
-        messagebox.showinfo("Succès", "Fichier XML généré avec succès!")
+        argv = ["--salles", salles, "--out", output]
+        if api_url:
+            argv += ["--api", api_url]
+        if mock_file:
+            argv += ["--mock", mock_file]
+        if shift_hours:
+            argv += ["--shift-hours", shift_hours]
+        if include_empty_days:
+            argv.append("--include-empty-days")
+        if no_filter_location:
+            argv.append("--no-filter-location")
+
+        try:
+            self.progress.start(argv, on_done=self.generation_done)
+        except ImportError as e:
+            messagebox.showerror("Erreur", f"Générateur introuvable : {e}")
+            return
+        self.generate_button.configure(state="disabled")
+
+    def generation_done(self, code, message):
+        self.generate_button.configure(state="normal")
+        if code == 0 and message:
+            messagebox.showwarning("Attention", message)
+        elif code == 0:
+            messagebox.showinfo("Succès", "Fichier XML généré avec succès!")
+        elif code is not None:
+            messagebox.showerror("Erreur", message or f"Échec de la génération (code {code})")
 
 if __name__ == "__main__":
     root = Tk()
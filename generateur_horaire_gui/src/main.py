@@ -1,9 +1,9 @@
 from tkinter import Tk, Label, Entry, Button, Checkbutton, IntVar, filedialog
-import subprocess
 import os
-import sys
 import json
 
+from generation import ProgressPanel
+
 CONFIG_FILE = "last_paths.json"
 
 class HorairesApp:
@@ -57,6 +57,9 @@ class HorairesApp:
         self.reload_button = Button(master, text="Charger les derniers chemins", command=self.load_last_paths)
         self.reload_button.pack()
 
+        self.progress = ProgressPanel(master)
+        self.progress.pack(fill="x", padx=5, pady=5)
+
         self.load_last_paths()
 
     def browse_salles(self):
@@ -83,15 +86,8 @@ class HorairesApp:
 
         self.save_last_paths()
 
-        # Résoudre le chemin absolu vers le script à partir du fichier courant
-        script_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "generateur_horaire_v2.py"))
-        if not os.path.exists(script_path):
-            print(f"Script introuvable: {script_path}")
-            return
-
-        # Utiliser le même interpréteur Python (sys.executable) et le chemin absolu
+        # Le générateur est importé et exécuté dans un thread : la fenêtre reste réactive
         command = [
-            sys.executable, script_path,
             "--salles", salles,
             "--out", output,
             "--api", api_url,
@@ -103,7 +99,17 @@ class HorairesApp:
         if no_filter_location:
             command.append("--no-filter-location")
 
-        subprocess.run(command)
+        try:
+            self.progress.start(command, on_done=self.generation_done)
+        except ImportError as e:
+            print(f"Générateur introuvable: {e}")
+            return
+        self.submit_button.configure(state="disabled")
+
+    def generation_done(self, code, message):
+        self.submit_button.configure(state="normal")
+        if message:
+            print(message)
 
     def save_last_paths(self):
         data = {
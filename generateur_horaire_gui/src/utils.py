@@ -5,22 +5,22 @@ def validate_file_path(file_path: str) -> bool:
 def validate_positive_integer(value: str) -> bool:
     return value.isdigit() and int(value) > 0
 
+def load_generator():
+    """Module generateur_horaire_v2 (racine du dépôt), importé une seule fois et partagé par les interfaces."""
+    import os
+    import sys
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+    if root not in sys.path:
+        sys.path.insert(0, root)
+    import generateur_horaire_v2
+    return generateur_horaire_v2
+
 def read_ini_file(file_path: str) -> list:
-    salles = []
     try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            for line in f:
-                s = line.strip()
-                if not s or s.startswith("#"):
-                    continue
-                if "=" in s:
-                    _, val = s.split("=", 1)
-                    val = val.strip()
-                    if val:
-                        salles.append(val)
+        return load_generator().load_salles_ini(file_path)
     except Exception as e:
         print(f"Error reading INI file: {e}")
-    return salles
+        return []
 
 def write_output_file(file_path: str, content: str) -> None:
     try:
@@ -1,69 +1,519 @@
 # -*- coding: utf-8 -*-
 """
-Générateur d'horaires XML (7 prochains jours) pour plusieurs locaux.
+Générateur d'horaires XML (7 prochains jours par défaut, --days N) pour plusieurs locaux.
 Mise à jour :
 - Chemins **relatifs** dans les exemples et usage.
 - Contrôle explicite des fins de lignes via --eol (lf par défaut).
 - Sortie XML strictement une ligne par <tNBEvent>.
 Compatible Python 3.8+.
 """
-import argparse
+import bisect
+import io
+import itertools
 import json
+import os
 import re
-from collections import defaultdict
-from datetime import datetime, timedelta, timezone
+import struct
+import sys
+import threading
+import time
+import zlib
+from collections import defaultdict, deque
+from array import array
+from datetime import date, datetime, timedelta, timezone
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional, List, Dict, Any
+from typing import (TYPE_CHECKING, Optional, List, Dict, Any, BinaryIO, Callable, Deque, Iterable, Iterator,
+                    Tuple, NamedTuple, Union)
 
-# ---- Fuseau Europe/Brussels (si disponible)
-try:
-    from zoneinfo import ZoneInfo  # Python 3.9+
-    TZ = ZoneInfo("Europe/Brussels")
-except Exception:
-    TZ = None
+# Démarrage léger : argparse, concurrent.futures (multiprocessing), hashlib, urllib, http.client, ssl
+# et zoneinfo ne sont importés que par le chemin qui s'en sert (cf. check_startup.py)
+if TYPE_CHECKING:
+    import argparse
+    from concurrent.futures import Future, ProcessPoolExecutor
 
-# ---- HTTP (POST): requests si présent, sinon urllib
-def http_post_text(url: str, data: Dict[str, str], timeout: int = 30) -> str:
+# ---- Fuseau Europe/Brussels (si disponible), chargé à la première utilisation
+@lru_cache(maxsize=None)
+def local_tz() -> Optional[Any]:
     try:
-        import requests  # type: ignore
-        resp = requests.post(url, data=data, timeout=timeout, headers={"User-Agent": "HoraireFetcher/1.0"})
-        resp.raise_for_status()
-        return resp.text
+        from zoneinfo import ZoneInfo  # Python 3.9+
+        return ZoneInfo("Europe/Brussels")
     except Exception:
+        return None
+
+# ---- HTTP (POST) : client réutilisable, connexions keep-alive partagées entre salles
+RETRYABLE_STATUS = frozenset({408, 425, 429, 502, 503, 504})
+REDIRECT_STATUS = frozenset({301, 302, 307, 308})  # le POST est renvoyé tel quel à la nouvelle adresse
+MAX_REDIRECTS = 5
+
+class HttpError(Exception):
+    """Erreur HTTP ou réseau; `retryable` indique si une nouvelle tentative a un sens."""
+    def __init__(self, message: str, status: Optional[int] = None, retryable: bool = False):
+        super().__init__(message)
+        self.status = status
+        self.retryable = retryable
+
+class RequestTiming(NamedTuple):
+    url: str
+    status: int
+    total_s: float      # durée totale, tentatives et attentes comprises
+    connect_s: float    # établissement TCP/TLS (0 si connexion réutilisée)
+    reused: bool        # connexion keep-alive réutilisée
+    attempts: int
+    nbytes: int         # octets reçus (compressés)
+
+class HttpResponse(NamedTuple):
+    status: int
+    headers: Dict[str, str]   # noms en minuscules
+    text: str
+    nbytes: int               # taille du corps décompressé, en octets
+    timing: RequestTiming
+
+class HttpClient:
+    """Client POST avec pool de connexions keep-alive par hôte, gzip et reprises.
+
+    Les reprises (backoff exponentiel avec gigue « full jitter ») ne concernent que
+    les erreurs réseau, les délais dépassés et les statuts de RETRYABLE_STATUS :
+    une erreur 500 ou 4xx n'est jamais renvoyée une seconde fois, ni un certificat refusé.
+    Les redirections 301/302/307/308 sont suivies (au plus MAX_REDIRECTS) et les proxys de
+    l'environnement (HTTP_PROXY, HTTPS_PROXY, NO_PROXY) respectés : tunnel CONNECT pour HTTPS.
+    Utilisable depuis plusieurs threads. Les mesures tiennent dans une mémoire bornée (le client
+    du mode résident vit aussi longtemps que lui) : agrégats cumulés et `timings`, les
+    `timings_max` dernières requêtes.
+    """
+    def __init__(self, timeout: float = 30, retries: int = 3, backoff: float = 0.5,
+                 backoff_max: float = 8.0, pool_size: int = 4,
+                 user_agent: str = "HoraireFetcher/1.0", timings_max: int = 1024):
+        self.timeout = timeout
+        self.retries = max(0, retries)
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.pool_size = max(1, pool_size)
+        self.user_agent = user_agent
+        self.timings: Deque[RequestTiming] = deque(maxlen=timings_max)
+        self._totals = {"requests": 0, "new_connections": 0, "reused_connections": 0,
+                        "connect_s": 0.0, "total_s": 0.0, "retries": 0, "bytes": 0}
+        self._lock = threading.Lock()
+        self._idle: Dict[Tuple[str, str, int], List[Any]] = defaultdict(list)
+        self._ssl_ctx = None
+        self._proxies: Dict[Tuple[str, str], Optional[Tuple[str, int, Dict[str, str]]]] = {}
+
+    # -- proxys de l'environnement
+    def _proxy_for(self, scheme: str, host: str) -> Optional[Tuple[str, int, Dict[str, str]]]:
+        """(hôte, port, en-têtes Proxy-Authorization) du proxy à utiliser pour `host`, sinon None.
+        L'environnement est lu une fois par (schéma, hôte)."""
+        key = (scheme, host)
+        if key not in self._proxies:
+            import urllib.request
+            proxy = urllib.request.getproxies().get(scheme)
+            self._proxies[key] = None if not proxy or urllib.request.proxy_bypass(host) else self._parse_proxy(proxy)
+        return self._proxies[key]
+
+    @staticmethod
+    def _parse_proxy(proxy: str) -> Tuple[str, int, Dict[str, str]]:
+        from urllib.parse import unquote, urlsplit
+        parts = urlsplit(proxy if "://" in proxy else "http://" + proxy)
+        if parts.scheme != "http" or not parts.hostname:
+            raise HttpError(f"Proxy non supporté: {proxy}")
+        auth: Dict[str, str] = {}
+        if parts.username is not None:
+            import base64
+            cred = f"{unquote(parts.username)}:{unquote(parts.password or '')}".encode("utf-8")
+            auth["Proxy-Authorization"] = "Basic " + base64.b64encode(cred).decode("ascii")
+        return parts.hostname, parts.port or 80, auth
+
+    # -- pool de connexions
+    def _acquire(self, scheme: str, host: str, port: int, timeout: float,
+                 proxy: Optional[Tuple[str, int, Dict[str, str]]] = None):
+        """Retourne (connexion, réutilisée?, durée d'établissement)."""
+        key = (scheme, host, port)
+        with self._lock:
+            idle = self._idle[key]
+            conn = idle.pop() if idle else None
+        if conn is not None:
+            conn.timeout = timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+            return conn, True, 0.0
+        import http.client
+        c_host, c_port = (proxy[0], proxy[1]) if proxy else (host, port)
+        if scheme == "https":
+            if self._ssl_ctx is None:
+                import ssl
+                self._ssl_ctx = ssl.create_default_context()
+            conn = http.client.HTTPSConnection(c_host, c_port, timeout=timeout, context=self._ssl_ctx)
+            if proxy:
+                conn.set_tunnel(host, port, headers=proxy[2])
+        else:
+            # proxy HTTP : même connexion, requête en URL absolue (voir _send_once)
+            conn = http.client.HTTPConnection(c_host, c_port, timeout=timeout)
+        t0 = time.perf_counter()
+        conn.connect()
+        return conn, False, time.perf_counter() - t0
+
+    def _release(self, key: Tuple[str, str, int], conn) -> None:
+        with self._lock:
+            idle = self._idle[key]
+            if len(idle) < self.pool_size:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def close(self) -> None:
+        with self._lock:
+            conns = [c for lst in self._idle.values() for c in lst]
+            self._idle.clear()
+        for c in conns:
+            c.close()
+
+    def __enter__(self) -> "HttpClient":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # -- requêtes
+    def _send_once(self, url: str, body: bytes, headers: Dict[str, str], timeout: float):
+        from urllib.parse import urlsplit
+        parts = urlsplit(url)
+        scheme = parts.scheme or "http"
+        if scheme not in ("http", "https"):
+            raise HttpError(f"Schéma non supporté: {url}")
+        port = parts.port or (443 if scheme == "https" else 80)
+        key = (scheme, parts.hostname or "", port)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        proxy = self._proxy_for(scheme, key[1])
+        if proxy and scheme == "http":
+            path = f"http://{parts.netloc.rpartition('@')[2]}{path}"
+            headers = {**headers, **proxy[2]}
+        import http.client
+        conn, reused, connect_s = self._acquire(scheme, key[1], port, timeout, proxy)
+        try:
+            try:
+                conn.request("POST", path, body=body, headers=headers)
+                resp = conn.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                if not reused:
+                    raise
+                # connexion keep-alive fermée côté serveur entre deux salles : une seule relance immédiate
+                conn.close()
+                conn, reused, connect_s = self._acquire(scheme, key[1], port, timeout, proxy)
+                reused = False
+                conn.request("POST", path, body=body, headers=headers)
+                resp = conn.getresponse()
+            raw = resp.read()
+        except BaseException:
+            conn.close()
+            raise
+        if resp.will_close:
+            conn.close()
+        else:
+            self._release(key, conn)
+        return resp, raw, reused, connect_s
+
+    def post(self, url: str, data: Dict[str, str], headers: Optional[Dict[str, str]] = None,
+             timeout: Optional[float] = None, deadline: Optional[float] = None) -> HttpResponse:
+        """POST formulaire; lève HttpError si le statut final n'est ni 2xx ni 304 (après redirections).
+        `deadline` (horloge time.monotonic()) borne la requête, tentatives et attentes comprises :
+        le délai de chaque tentative est réduit au temps restant, et aucune reprise n'est tentée
+        si elle ne peut aboutir avant l'échéance."""
+        import socket
         import urllib.parse
-        import urllib.request
-        encoded = urllib.parse.urlencode(data).encode("utf-8")
-        req = urllib.request.Request(url, data=encoded, headers={"User-Agent": "HoraireFetcher/1.0"})
-        with urllib.request.urlopen(req, timeout=timeout) as resp:
-            return resp.read().decode("utf-8")
+        timeout = self.timeout if timeout is None else timeout
+        body = urllib.parse.urlencode(data).encode("utf-8")
+        hdrs = {
+            "User-Agent": self.user_agent,
+            "Accept-Encoding": "gzip",
+            "Content-Type": "application/x-www-form-urlencoded",
+            "Connection": "keep-alive",
+        }
+        if headers:
+            hdrs.update(headers)
+        t_start = time.perf_counter()
+        attempt = 0
+        target, redirects = url, 0
+        while True:
+            attempt += 1
+            retry_after = 0.0
+            attempt_timeout = timeout
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise HttpError(f"Délai dépassé pour {url} ({attempt - 1} tentative(s))")
+                attempt_timeout = min(timeout, remaining)
+            try:
+                resp, raw, reused, connect_s = self._send_once(target, body, hdrs, attempt_timeout)
+                status = resp.status
+                if 200 <= status < 300 or status == 304:
+                    break
+                location = resp.getheader("Location")
+                if status in REDIRECT_STATUS and location:
+                    redirects += 1
+                    if redirects > MAX_REDIRECTS:
+                        raise HttpError(f"Plus de {MAX_REDIRECTS} redirections pour {url}", status=status)
+                    target = urllib.parse.urljoin(target, location)
+                    attempt -= 1  # une redirection n'est pas une nouvelle tentative
+                    continue
+                err = HttpError(f"HTTP {status} pour {url}", status=status,
+                                retryable=status in RETRYABLE_STATUS)
+                ra = resp.getheader("Retry-After")
+                if ra and ra.strip().isdigit():
+                    retry_after = float(ra.strip())
+            except HttpError:
+                raise
+            except (OSError, socket.timeout, EOFError) as e:
+                ssl = sys.modules.get("ssl")  # importé par la première connexion HTTPS
+                if ssl is not None and isinstance(e, ssl.SSLCertVerificationError):
+                    raise HttpError(f"Certificat refusé pour {url}: {e}") from e
+                err = HttpError(f"Erreur réseau pour {url}: {e}", retryable=True)
+            except Exception as e:  # http.client.HTTPException (réponse invalide, etc.)
+                err = HttpError(f"Réponse invalide pour {url}: {e}", retryable=True)
+            if not err.retryable or attempt > self.retries:
+                raise err
+            import random
+            delay = random.uniform(0, min(self.backoff_max, self.backoff * (2 ** (attempt - 1))))
+            delay = min(self.backoff_max, max(delay, retry_after))
+            if deadline is not None and time.monotonic() + delay >= deadline:
+                raise err
+            time.sleep(delay)
+        if (resp.getheader("Content-Encoding") or "").lower() == "gzip":
+            import gzip
+            payload = gzip.decompress(raw)
+        else:
+            payload = raw
+        charset = resp.headers.get_content_charset() or "utf-8"
+        timing = RequestTiming(url, status, time.perf_counter() - t_start, connect_s,
+                               reused, attempt, len(raw))
+        with self._lock:
+            self.timings.append(timing)
+            tot = self._totals
+            tot["requests"] += 1
+            tot["reused_connections" if reused else "new_connections"] += 1
+            tot["connect_s"] += connect_s
+            tot["total_s"] += timing.total_s
+            tot["retries"] += attempt - 1
+            tot["bytes"] += len(raw)
+        return HttpResponse(status, {k.lower(): v for k, v in resp.getheaders()},
+                            payload.decode(charset, errors="replace"), len(payload), timing)
+
+    def summary(self) -> Dict[str, float]:
+        """Agrégats de toutes les requêtes effectuées depuis la création du client."""
+        with self._lock:
+            return dict(self._totals)
 
 # ---- Utils
-def load_salles_ini(path: str) -> List[str]:
-    salles: List[str] = []
+def load_targets_ini(path: str) -> Dict[str, List[str]]:
+    """Cibles du fichier .ini : {section: salles}, dans l'ordre du fichier. Un fichier à plat
+    (sans [section]) donne une seule cible "" ; une section répétée complète la première.
+    Un .ini classique à une seule section ([salles]) reste une seule cible (voir check_targets)."""
+    targets: Dict[str, List[str]] = {}
+    section = ""
     with open(path, "r", encoding="utf-8") as f:
         for line in f:
             s = line.strip()
             if not s or s.startswith("#"):
                 continue
-            if "=" in s:
+            if s.startswith("[") and s.endswith("]"):
+                section = s[1:-1].strip()
+                if not section:
+                    raise ValueError(f"{path} : section sans nom")
+                targets.setdefault(section, [])
+            elif "=" in s:
                 _, val = s.split("=", 1)
                 val = val.strip()
                 if val:
-                    salles.append(val)
-    return salles
+                    targets.setdefault(section, []).append(val)
+    if "" in targets and len(targets) > 1:
+        raise ValueError(f"{path} : salle(s) avant la première section")
+    return targets
+
+def load_salles_ini(path: str) -> List[str]:
+    """Salles à récupérer : la liste du fichier à plat, ou les salles distinctes de toutes
+    les sections (une salle partagée par plusieurs cibles n'est récupérée qu'une fois)."""
+    targets = load_targets_ini(path)
+    if "" in targets:
+        return targets[""]
+    return list(dict.fromkeys(s for salles in targets.values() for s in salles))
+
+def target_path(out: str, target: str) -> Path:
+    """Fichier XML d'une cible : {target} dans --out est remplacé par le nom de la section."""
+    return Path(out.replace("{target}", target))
+
+def check_targets(targets: Dict[str, List[str]], out: str, occupancy_out: Optional[str] = None) -> Optional[str]:
+    if "" in targets:
+        for opt, path in (("--out", out), ("--occupancy-out", occupancy_out or "")):
+            if "{target}" in path:
+                return f"{opt} contient {{target}} mais le fichier de salles n'a pas de section"
+        return None
+    if "{target}" not in out and len(targets) > 1:
+        return "le fichier de salles a plusieurs sections : --out doit contenir {target} (ex. Horaire_{target}.xml)"
+    return None
+
+# ---- Normalisation des textes (location, summary) : motifs précompilés, mémo borné
+CLEAN_MEMO_SIZE = 1 << 14
+_RE_NEWLINES = re.compile(r"[\r\n]+")
+_RE_SPACES = re.compile(r"\s{2,}")
+_RE_NEEDS_CLEAN = re.compile(r"[\r\n\u00a0]|\s\s|^\s|\s$")
+
+@lru_cache(maxsize=CLEAN_MEMO_SIZE)
+def _clean_text_memo(x: str) -> str:
+    if _RE_NEEDS_CLEAN.search(x) is None:
+        return sys.intern(x)  # chemin rapide : rien à modifier
+    x = x.replace("\u00a0", " ")
+    x = _RE_NEWLINES.sub(" ", x)
+    x = _RE_SPACES.sub(" ", x)
+    return sys.intern(x.strip())
 
 def clean_text(x: Optional[str]) -> str:
+    """Espaces insécables et sauts de ligne -> espace, espaces multiples réduits, bords retirés.
+    Mémoïsé : les mêmes intitulés reviennent dans des centaines de créneaux; le résultat est interné."""
     if x is None:
         return ""
-    x = x.replace("\u00a0", " ")
-    x = re.sub(r"[\r\n]+", " ", x)
-    x = re.sub(r"\s{2,}", " ", x)
-    return x.strip()
+    return _clean_text_memo(x)
 
-def parse_dt_ical(dt_str: Optional[str]) -> Optional[datetime]:
-    """Transforme 'YYYYMMDDTHHMMSSZ?' en datetime; convertit vers Europe/Brussels si 'Z'."""
-    if not dt_str:
-        return None
+def clean_text_stats() -> Dict[str, Any]:
+    """Taux de succès du mémo de clean_text (pour --verbose / --metrics-out)."""
+    info = _clean_text_memo.cache_info()
+    calls = info.hits + info.misses
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize,
+            "hit_rate": info.hits / calls if calls else 0.0}
+
+# ---- Lecture en flux de horaire.ICAL (un créneau à la fois, sans liste intermédiaire)
+_FEED_KEYS = frozenset(("location", "dtstart", "dtend", "summary;language=fr", "summary"))
+_JSON_WS = re.compile(r"[ \t\n\r]*")
+
+def window_margin(shift_hours: int) -> timedelta:
+    """Marge autour de la fenêtre : un horodatage brut peut changer de jour une fois
+    converti en heure locale (UTC+1 ou UTC+2) et décalé de `shift_hours`."""
+    return timedelta(days=(abs(shift_hours) + 2) // 24 + 1)
+
+class FeedItemFilter:
+    """object_pairs_hook de json : ne garde que les champs utiles d'un créneau et
+    écarte (None) ceux d'une autre salle ou hors fenêtre avant de construire le dict."""
+    def __init__(self, salle_filter: Optional[str] = None,
+                 start_date: Optional[date] = None, end_date: Optional[date] = None,
+                 shift_hours: int = 0):
+        self.salle_filter = salle_filter
+        margin = window_margin(shift_hours)
+        self.lo = (start_date - margin).strftime("%Y%m%d") if start_date else None
+        self.hi = (end_date + margin).strftime("%Y%m%d") if end_date else None
+
+    def __call__(self, pairs: List[Tuple[str, Any]]) -> Optional[Dict[str, Any]]:
+        item = {k: v for k, v in pairs if k in _FEED_KEYS}
+        dt = item.get("dtstart")
+        if isinstance(dt, str) and dt[:8].isdigit():
+            if (self.lo and dt[:8] < self.lo) or (self.hi and dt[:8] > self.hi):
+                return None
+        if self.salle_filter:
+            loc = item.get("location")
+            if loc != self.salle_filter and clean_text(loc) != self.salle_filter:
+                return None
+        return item
+
+def _iter_json_array(s: str, idx: int, decoder: json.JSONDecoder) -> Iterator[Any]:
+    """Décode un à un les éléments du tableau JSON commençant à s[idx] == '['.
+    Retourne (StopIteration.value) l'index qui suit le ']'."""
+    idx = _JSON_WS.match(s, idx + 1).end()
+    if s.startswith("]", idx):
+        return idx + 1
+    while True:
+        item, idx = decoder.raw_decode(s, idx)
+        yield item
+        idx = _JSON_WS.match(s, idx).end()
+        c = s[idx:idx + 1]
+        if c == "]":
+            return idx + 1
+        if c != ",":
+            raise ValueError(f"JSON invalide à la position {idx}")
+        idx = _JSON_WS.match(s, idx + 1).end()
+
+def _iter_ical_feed(ical_str: str, decoder: json.JSONDecoder) -> Iterator[Dict[str, Any]]:
+    """Parcourt l'objet JSON de premier niveau de ICAL et produit les éléments de 'feed'."""
+    skip = json.JSONDecoder()
+    s = ical_str
+    idx = _JSON_WS.match(s, 0).end()
+    if not s.startswith("{", idx):
+        return
+    idx = _JSON_WS.match(s, idx + 1).end()
+    while idx < len(s) and s[idx] != "}":
+        key, idx = skip.raw_decode(s, idx)
+        idx = _JSON_WS.match(s, idx).end()
+        if not s.startswith(":", idx):
+            raise ValueError(f"JSON invalide à la position {idx}")
+        idx = _JSON_WS.match(s, idx + 1).end()
+        if key == "feed" and s.startswith("[", idx):
+            idx = yield from _iter_json_array(s, idx, decoder)
+        else:
+            _, idx = skip.raw_decode(s, idx)
+        idx = _JSON_WS.match(s, idx).end()
+        if s.startswith(",", idx):
+            idx = _JSON_WS.match(s, idx + 1).end()
+
+def iter_feed(struct: Dict[str, Any], item_filter: Optional[FeedItemFilter] = None) -> Iterator[Dict[str, Any]]:
+    """Créneaux de struct['horaire']['ICAL'] (chaîne JSON) ou de struct['feed'], un à un.
+
+    horaire.ICAL est décodé élément par élément (json.JSONDecoder.raw_decode) au lieu
+    d'un second json.loads sur tout le flux; `item_filter` écarte les créneaux inutiles
+    pendant le décodage. Un flux tronqué livre les créneaux lisibles avant l'erreur."""
+    if not isinstance(struct, dict):
+        return
+    horaire = struct.get("horaire")
+    if isinstance(horaire, dict) and "ICAL" in horaire:
+        ical_str = horaire.get("ICAL", "")
+        if not isinstance(ical_str, str):
+            return
+        decoder = json.JSONDecoder(object_pairs_hook=item_filter or FeedItemFilter())
+        try:
+            for item in _iter_ical_feed(ical_str, decoder):
+                if isinstance(item, dict):
+                    yield item
+        except ValueError:
+            return
+        return
+    feed = struct.get("feed")
+    if isinstance(feed, list):
+        yield from feed
+
+# ---- Chemin rapide : dates iCal -> (ordinal du jour, minutes), mémoïsé
+ICAL_MEMO_SIZE = 1 << 16
+_HHMM = [f"{m // 60:02d}{m % 60:02d}" for m in range(24 * 60)]
+
+class UtcOffsetTable:
+    """Décalage UTC (minutes) d'Europe/Brussels pour chaque heure UTC d'une plage de jours.
+    Évite un astimezone() par créneau; hors plage, on retombe sur astimezone()."""
+    def __init__(self):
+        self.first = 0
+        self.offsets: List[int] = []
+
+    def covers(self, first_ord: int, last_ord: int) -> bool:
+        return self.first <= first_ord and last_ord < self.first + len(self.offsets) // 24
+
+    def prepare(self, first_day: date, last_day: date) -> None:
+        tz = local_tz()
+        if tz is None or self.covers(first_day.toordinal(), last_day.toordinal()):
+            return
+        first = first_day.toordinal()
+        base = datetime(first_day.year, first_day.month, first_day.day, tzinfo=timezone.utc)
+        n_hours = (last_day.toordinal() - first + 1) * 24
+        offsets = [int((base + timedelta(hours=h)).astimezone(tz).utcoffset().total_seconds()) // 60
+                   for h in range(n_hours)]
+        self.first, self.offsets = first, offsets
+
+    def offset(self, ordinal: int, hour: int, minute: int) -> int:
+        i = (ordinal - self.first) * 24 + hour
+        if 0 <= i < len(self.offsets):
+            return self.offsets[i]
+        utc = datetime.fromordinal(ordinal).replace(hour=hour, minute=minute, tzinfo=timezone.utc)
+        return int(utc.astimezone(local_tz()).utcoffset().total_seconds()) // 60
+
+_UTC_OFFSETS = UtcOffsetTable()
+
+@lru_cache(maxsize=ICAL_MEMO_SIZE)
+def ical_local_minutes(dt_str: str, shift_hours: int = 0) -> Optional[Tuple[int, int]]:
+    """'YYYYMMDDTHHMMSS[Z]' -> (date.toordinal(), minutes depuis minuit) en heure locale (Europe/Brussels
+    si 'Z'), décalé de `shift_hours`. Mémoïsé : les flux répètent les mêmes horodatages."""
     s = dt_str.strip()
     zulu = s.endswith("Z")
     if zulu:
@@ -74,149 +524,805 @@ def parse_dt_ical(dt_str: Optional[str]) -> Optional[datetime]:
     try:
         year = int(date_part[0:4]); month = int(date_part[4:6]); day = int(date_part[6:8])
         hour = int(time_part[0:2]); minute = int(time_part[2:4])
-        dt = datetime(year, month, day, hour, minute)
-        if zulu:
-            dt = dt.replace(tzinfo=timezone.utc)
-            if TZ is not None:
-                dt = dt.astimezone(TZ)
-        else:
-            if TZ is not None:
-                dt = dt.replace(tzinfo=TZ)
-        return dt
+        if not (0 <= hour < 24 and 0 <= minute < 60):
+            return None
+        ordinal = date(year, month, day).toordinal()
     except Exception:
         return None
+    minutes = hour * 60 + minute + shift_hours * 60
+    if zulu and local_tz() is not None:
+        minutes += _UTC_OFFSETS.offset(ordinal, hour, minute)
+    days, minutes = divmod(minutes, 24 * 60)
+    return ordinal + days, minutes
 
-def normalize_feed(struct: Dict[str, Any]) -> List[Dict[str, Any]]:
-    """Accepte struct['horaire']['ICAL'] (string JSON) ou struct['feed'] direct."""
-    if isinstance(struct, dict):
-        horaire = struct.get("horaire")
-        if isinstance(horaire, dict) and "ICAL" in horaire:
-            ical_str = horaire.get("ICAL", "")
-            try:
-                ical = json.loads(ical_str)
-                feed = ical.get("feed", [])
-                return feed if isinstance(feed, list) else []
-            except Exception:
-                return []
-        feed = struct.get("feed")
-        if isinstance(feed, list):
-            return feed
-    return []
-
-def events_from_feed(feed: List[Dict[str, Any]], salle_filter: Optional[str],
-                     start_date, end_date, shift_hours: int) -> List[Dict[str, str]]:
-    evts: List[Dict[str, str]] = []
+@lru_cache(maxsize=4096)
+def ordinal_to_datekey(ordinal: int) -> str:
+    d = date.fromordinal(ordinal)
+    return f"{d.year:04d}{d.month:02d}{d.day:02d}"
+
+# ---- Représentation compacte d'un créneau
+class Event(NamedTuple):
+    """Créneau normalisé. `day` = date.toordinal(), `start`/`end` en minutes depuis minuit;
+    textes internés (clean_text). L'ordre des champs est l'ordre de tri de la fusion.
+    Le formatage HHMM / YYYYMMDD n'a lieu qu'à la sérialisation."""
+    day: int
+    location: str
+    summary: str
+    start: int
+    end: int
+
+def events_from_feed(feed: Iterable[Dict[str, Any]], salle_filter: Optional[str],
+                     start_date, end_date, shift_hours: int) -> List[Event]:
+    evts: List[Event] = []
+    start_ord = start_date.toordinal() if start_date else None
+    end_ord = end_date.toordinal() if end_date else None
+    if start_date and end_date:
+        # heures UTC pouvant tomber dans la fenêtre une fois converties et décalées
+        margin = window_margin(shift_hours)
+        _UTC_OFFSETS.prepare(start_date - margin, end_date + margin)
     for it in feed:
         loc = clean_text(it.get("location"))
         if salle_filter and loc != salle_filter:
             continue
-        dt1 = parse_dt_ical(it.get("dtstart"))
-        dt2 = parse_dt_ical(it.get("dtend"))
-        if not dt1 or not dt2:
+        raw1 = it.get("dtstart")
+        raw2 = it.get("dtend")
+        t1 = ical_local_minutes(raw1, shift_hours) if raw1 else None
+        t2 = ical_local_minutes(raw2, shift_hours) if raw2 else None
+        if not t1 or not t2:
             continue
-        # appliquer le décalage horaire demandé
-        if shift_hours:
-            dt1 = dt1 + timedelta(hours=shift_hours)
-            dt2 = dt2 + timedelta(hours=shift_hours)
-        if start_date and dt1.date() < start_date:
+        day_ord, start_min = t1
+        if start_ord is not None and day_ord < start_ord:
             continue
-        if end_date and dt1.date() > end_date:
+        if end_ord is not None and day_ord > end_ord:
             continue
         summary = clean_text(it.get("summary;language=fr") or it.get("summary"))
-        evts.append({
-            "LOCATION": loc,
-            "TimeSTART": dt1.strftime("%H%M"),
-            "TimeEND": dt2.strftime("%H%M"),
-            "SUMMARY": summary,
-            "DATEKEY": dt1.strftime("%Y%m%d")
-        })
+        evts.append(Event(day_ord, loc, summary, start_min, t2[1]))
     return evts
 
-# ---- Fusion des créneaux contigus (même LOCATION & SUMMARY)
-def _hhmm_to_minutes(hhmm: str) -> int:
-    try:
-        return int(hhmm[:2]) * 60 + int(hhmm[2:4])
-    except Exception:
-        return 0
+# ---- Fusion des créneaux (même jour, LOCATION & SUMMARY) : contigus, chevauchants, ou séparés d'au plus `gap` minutes
+DAY_MINUTES = 24 * 60
 
-def _minutes_to_hhmm(m: int) -> str:
-    h = (m // 60) % 24
-    mn = m % 60
-    return f"{h:02d}{mn:02d}"
-
-def merge_contiguous_events(day_events: List[Dict[str, str]]) -> List[Dict[str, str]]:
-    """Regroupe les créneaux contigus si TimeEND == TimeSTART suivant et (LOCATION,SUMMARY) identiques."""
-    if not day_events:
-        return []
-    day_events = sorted(day_events, key=lambda e: (e.get("LOCATION",""), e.get("SUMMARY",""), e.get("TimeSTART",""), e.get("TimeEND","")))
-    merged: List[Dict[str, str]] = []
-    cur: Optional[Dict[str, str]] = None
-    for e in day_events:
-        if cur is None:
-            cur = dict(e)
+def event_end(e: Event) -> int:
+    """Fin du créneau en minutes depuis le minuit de `e.day` : une fin antérieure au début
+    (créneau finissant à minuit ou après) passe au lendemain; fin == début reste un créneau vide."""
+    return e.end + DAY_MINUTES if e.end < e.start else e.end
+
+def _merge_group(group: List[Event], gap: int) -> Iterator[Event]:
+    """Fusionne en une passe les intervalles d'un même (jour, location, summary).
+    Les fins sont lues par event_end (passage de minuit)."""
+    group.sort()
+    first = group[0]
+    cur_end = event_end(first)
+    for e in itertools.islice(group, 1, None):
+        end = event_end(e)
+        if e.start <= cur_end + gap:
+            if end > cur_end:
+                cur_end = end
             continue
-        same_loc = e.get("LOCATION","") == cur.get("LOCATION","")
-        same_sum = e.get("SUMMARY","") == cur.get("SUMMARY","")
-        if same_loc and same_sum:
-            end_cur = _hhmm_to_minutes(cur.get("TimeEND","0000"))
-            start_e = _hhmm_to_minutes(e.get("TimeSTART","0000"))
-            if start_e == end_cur:
-                end_e = _hhmm_to_minutes(e.get("TimeEND","0000"))
-                if end_e > end_cur:
-                    cur["TimeEND"] = _minutes_to_hhmm(end_e)
-                continue
-        merged.append(cur)
-        cur = dict(e)
-    if cur is not None:
-        merged.append(cur)
+        yield first if first.end == cur_end % DAY_MINUTES else first._replace(end=cur_end % DAY_MINUTES)
+        first, cur_end = e, end
+    yield first if first.end == cur_end % DAY_MINUTES else first._replace(end=cur_end % DAY_MINUTES)
+
+def merge_contiguous_events(day_events: List[Event], gap: int = 0) -> List[Event]:
+    """Regroupe par (jour, location, summary) puis fusionne les créneaux contigus ou qui se
+    chevauchent (doublons compris), ainsi que ceux séparés d'au plus `gap` minutes.
+    Résultat trié par (jour, location, summary, start)."""
+    groups: Dict[Tuple[int, str, str], List[Event]] = defaultdict(list)
+    for e in day_events:
+        groups[e[:3]].append(e)
+    merged: List[Event] = []
+    for key in sorted(groups):
+        merged.extend(_merge_group(groups[key], gap))
     return merged
 
-def ensure_full_week(events_by_date: Dict[str, list], start_date) -> None:
-    for i in range(7):
-        dkey = (start_date + timedelta(days=i)).strftime("%Y%m%d")
-        events_by_date.setdefault(dkey, [])
-
-def build_xml(events_by_date: Dict[str, list]) -> str:
-    """Sérialise le XML, <tNBEvent> sur une seule ligne, sauts de ligne entre nœuds (LF)."""
-    from xml.etree import ElementTree as ET
-    root = ET.Element("dataentry")
-    for idx, (date_key, evts) in enumerate(sorted(events_by_date.items())):
-        day = ET.SubElement(root, 'MAIN.DayOfWeek', attrib={"index": str(idx)})
-        ddate = ET.SubElement(day, "dDate"); ddate.text = date_key
+def merged_events_by_date(evts: List[Event], gap: int = 0) -> Dict[int, List[Event]]:
+    """Événements fusionnés d'une salle, groupés par jour (ordinal)."""
+    by_day: Dict[int, List[Event]] = {}
+    for e in merge_contiguous_events(evts, gap):
+        lst = by_day.get(e.day)
+        if lst is None:
+            lst = by_day[e.day] = []
+        lst.append(e)
+    return by_day
+
+class DayBuckets:
+    """Événements de la fenêtre [start_date, start_date + n_days[, rangés dans un tableau
+    préalloué indexé par (ordinal - premier jour). None = jour absent du XML."""
+    def __init__(self, start_date: date, n_days: int):
+        self.first = start_date.toordinal()
+        self.days: List[Optional[List[Event]]] = [None] * n_days
+
+    def extend(self, evts: Iterable[Event]) -> None:
+        days, first, n = self.days, self.first, len(self.days)
+        for e in evts:
+            i = e.day - first
+            if 0 <= i < n:
+                lst = days[i]
+                if lst is None:
+                    lst = days[i] = []
+                lst.append(e)
+
+    def fill_empty(self) -> None:
+        """Ajoute les jours sans événement (--include-empty-days)."""
+        self.days = [[] if lst is None else lst for lst in self.days]
+
+    def items(self) -> Iterator[Tuple[int, List[Event]]]:
+        """(ordinal, événements) des jours présents, dans l'ordre chronologique."""
+        first = self.first
+        for i, lst in enumerate(self.days):
+            if lst is not None:
+                yield first + i, lst
+
+def iter_days(events_by_date: Union[DayBuckets, Dict[int, List[Event]]]) -> Iterable[Tuple[int, List[Event]]]:
+    if isinstance(events_by_date, DayBuckets):
+        return events_by_date.items()
+    return sorted(events_by_date.items())
+
+# ---- Sérialisation XML en flux (aucun DOM, une ligne par <tNBEvent>)
+EOLS = {"lf": "\n", "crlf": "\r\n"}
+_HHMM_B = [h.encode("ascii") for h in _HHMM]
+_XML_ESCAPE = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;"})
+
+@lru_cache(maxsize=8192)
+def _xml_text(s: str) -> bytes:
+    """Texte d'élément échappé et encodé en UTF-8 (mémoïsé : salles et intitulés se répètent)."""
+    return s.translate(_XML_ESCAPE).encode("utf-8")
+
+def write_xml(out: BinaryIO, events_by_date: Union[DayBuckets, Dict[int, List[Event]]],
+              eol: str = "\n") -> None:
+    """Écrit le XML ligne par ligne dans le flux binaire `out`, avec la fin de ligne `eol`.
+    `events_by_date` : DayBuckets ou dict indexé par ordinal de jour (date.toordinal())."""
+    nl = eol.encode("ascii")
+    w = out.write
+    w(b"<dataentry>" + nl)
+    for idx, (day, evts) in enumerate(iter_days(events_by_date)):
+        w(b'<MAIN.DayOfWeek index="%d">%s<dDate>%s</dDate>%s'
+          % (idx, nl, ordinal_to_datekey(day).encode("ascii"), nl))
         for i, e in enumerate(evts):
-            t = ET.SubElement(day, "tNBEvent", attrib={"index": str(i)})
-            ET.SubElement(t, "LOCATION").text  = e.get("LOCATION", "")
-            ET.SubElement(t, "TimeSTART").text = e.get("TimeSTART", "")
-            ET.SubElement(t, "TimeEND").text   = e.get("TimeEND", "")
-            ET.SubElement(t, "SUMMARY").text   = e.get("SUMMARY", "")
-    # Construction manuelle
-    lines = ["<dataentry>"]
-    for day in root:
-        lines.append(f'<MAIN.DayOfWeek index="{day.attrib.get("index","0")}">')
-        # dDate
-        for c in day:
-            if c.tag == "dDate":
-                lines.append(f'<dDate>{c.text or ""}</dDate>')
-                break
-        # événements (une seule ligne chacun)
-        for child in day:
-            if child.tag != "tNBEvent":
+            w(b'<tNBEvent index="%d"><LOCATION>%s</LOCATION><TimeSTART>%s</TimeSTART>'
+              b'<TimeEND>%s</TimeEND><SUMMARY>%s</SUMMARY></tNBEvent>%s'
+              % (i, _xml_text(e.location), _HHMM_B[e.start], _HHMM_B[e.end], _xml_text(e.summary), nl))
+        w(b"</MAIN.DayOfWeek>" + nl)
+    w(b"</dataentry>" + nl)
+
+# ---- Besoin de chauffe : occupation par créneaux de 10 minutes (--occupancy-out)
+OCC_SLOT = 10
+OCC_SLOTS = DAY_MINUTES // OCC_SLOT  # 144 créneaux par jour
+_OCC_HHMM_B = [b"%02d%02d" % divmod(i * OCC_SLOT, 60) for i in range(OCC_SLOTS + 1)]  # 144 -> 2400
+_OCC_BITS = bytes.maketrans(b"\x00\x01", b"01")
+
+def room_occupancy(days: Dict[int, List[Event]], start_date: date, n_days: int,
+                   preheat: int = 0, postheat: int = 0) -> bytearray:
+    """Occupation d'une salle sur la fenêtre : un octet 0/1 par créneau de 10 minutes, jours bout
+    à bout. Chaque événement fusionné est élargi de `preheat` minutes avant et `postheat` après
+    (arrondi au créneau englobant) ; une marge qui franchit minuit déborde sur le jour voisin.
+    Un créneau vide (fin == début) ne chauffe que ses marges."""
+    slots = bytearray(n_days * OCC_SLOTS)
+    first, total = start_date.toordinal(), len(slots)
+    for evts in days.values():
+        for e in evts:
+            a, b = e.start - preheat, event_end(e) + postheat
+            if a >= b:
                 continue
-            parts = []
-            for sub in child:
-                text = "" if sub.text is None else sub.text
-                parts.append(f'<{sub.tag}>{text}</{sub.tag}>')
-            inner = "".join(parts)
-            idx_attr = child.attrib.get("index", "0")
-            lines.append(f'<tNBEvent index="{idx_attr}">{inner}</tNBEvent>')
-        lines.append("</MAIN.DayOfWeek>")
-    lines.append("</dataentry>")
-    return "\n".join(lines) + "\n"
+            base = (e.day - first) * OCC_SLOTS
+            lo = max(0, base + a // OCC_SLOT)
+            hi = min(total, base - (-b // OCC_SLOT))
+            if lo < hi:
+                slots[lo:hi] = b"\x01" * (hi - lo)
+    return slots
+
+def occupied_intervals(slots: bytearray, i: int) -> List[Tuple[int, int]]:
+    """Plages occupées du jour `i` de la fenêtre, en créneaux [début, fin[ (fin <= 144)."""
+    lo, hi = i * OCC_SLOTS, (i + 1) * OCC_SLOTS
+    out = []
+    pos = slots.find(1, lo, hi)
+    while pos >= 0:
+        end = slots.find(0, pos, hi)
+        if end < 0:
+            end = hi
+        out.append((pos - lo, end - lo))
+        pos = slots.find(1, end, hi)
+    return out
+
+def day_mask(slots: bytearray, i: int) -> int:
+    """Masque de 144 bits du jour `i` : le créneau 00:00-00:10 est le bit de poids fort."""
+    return int(slots[i * OCC_SLOTS:(i + 1) * OCC_SLOTS].translate(_OCC_BITS), 2)
+
+def write_occupancy(out: BinaryIO, rooms: List[str], room_days: Dict[str, Dict[int, List[Event]]],
+                    start_date: date, n_days: int, preheat: int = 0, postheat: int = 0,
+                    eol: str = "\n") -> int:
+    """Écrit l'occupation de chaque salle, jour par jour (jours inoccupés omis) : masque de 144 bits
+    en hexadécimal et liste compacte des plages occupées HHMM-HHMM. Retourne le nombre de plages."""
+    nl = eol.encode("ascii")
+    w = out.write
+    n = 0
+    w(b'<occupancy slotMinutes="%d" preheat="%d" postheat="%d">%s' % (OCC_SLOT, preheat, postheat, nl))
+    first = start_date.toordinal()
+    for idx, salle in enumerate(rooms):
+        slots = room_occupancy(room_days.get(salle, {}), start_date, n_days, preheat, postheat)
+        w(b'<ROOM index="%d"><LOCATION>%s</LOCATION>%s' % (idx, _xml_text(salle), nl))
+        for i in range(n_days):
+            spans = occupied_intervals(slots, i)
+            if not spans:
+                continue
+            n += len(spans)
+            w(b"<DAY><dDate>%s</dDate><BITS>%036X</BITS><ON>%s</ON></DAY>%s"
+              % (ordinal_to_datekey(first + i).encode("ascii"), day_mask(slots, i),
+                 b" ".join(_OCC_HHMM_B[a] + b"-" + _OCC_HHMM_B[b] for a, b in spans), nl))
+        w(b"</ROOM>" + nl)
+    w(b"</occupancy>" + nl)
+    return n
+
+# ---- Cache disque des réponses API (clé : URL de l'API + codeSalle)
+class CacheEntry(NamedTuple):
+    text: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fetched_at: float   # epoch de la dernière réponse (ou revalidation) du serveur
+    nbytes: int         # taille de la réponse en octets (UTF-8)
+
+class ResponseCache:
+    """Un fichier JSON par (api_url, salle) dans `directory`.
+
+    Une entrée plus jeune que `ttl` secondes est servie sans appel réseau; au-delà,
+    elle est revalidée (If-None-Match / If-Modified-Since) si le serveur a fourni
+    des validateurs. Les écritures passent par un fichier temporaire + rename.
+    """
+    def __init__(self, directory: str, ttl: float = 3600):
+        self.directory = Path(directory)
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.bytes_saved = 0
+        self._lock = threading.Lock()
+
+    def _path(self, api_url: str, salle: str) -> Path:
+        import hashlib
+        digest = hashlib.sha1(f"{api_url}\n{salle}".encode("utf-8")).hexdigest()
+        return self.directory / f"{digest}.json"
+
+    def load(self, api_url: str, salle: str) -> Optional[CacheEntry]:
+        try:
+            raw = json.loads(self._path(api_url, salle).read_text(encoding="utf-8"))
+            text = raw["text"]
+            nbytes = raw.get("nbytes")
+            return CacheEntry(text, raw.get("etag"), raw.get("last_modified"), float(raw.get("fetched_at", 0)),
+                              nbytes if isinstance(nbytes, int) else len(text.encode("utf-8")))
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        return self.ttl > 0 and (time.time() - entry.fetched_at) < self.ttl
+
+    def store(self, api_url: str, salle: str, text: str, nbytes: int,
+              etag: Optional[str] = None, last_modified: Optional[str] = None) -> None:
+        path = self._path(api_url, salle)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        payload = {"api": api_url, "salle": salle, "etag": etag, "last_modified": last_modified,
+                   "fetched_at": time.time(), "nbytes": nbytes, "text": text}
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, path)
+
+    def count(self, hit: bool, saved: int = 0, revalidated: bool = False) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+                self.bytes_saved += saved
+            else:
+                self.misses += 1
+            if revalidated:
+                self.revalidated += 1
+
+# ---- Limitation du nombre de requêtes simultanées par hôte
+class HostLimiter:
+    """Sémaphore par hôte (netloc) : au plus `per_host` requêtes en vol vers un même serveur."""
+    def __init__(self, per_host: int = 4):
+        self.per_host = max(1, per_host)
+        self._lock = threading.Lock()
+        self._sems: Dict[str, threading.BoundedSemaphore] = {}
+
+    def slot(self, url: str) -> threading.BoundedSemaphore:
+        from urllib.parse import urlsplit
+        host = urlsplit(url).netloc
+        with self._lock:
+            sem = self._sems.get(host)
+            if sem is None:
+                sem = self._sems[host] = threading.BoundedSemaphore(self.per_host)
+        return sem
+
+def _decode_api_text(text: str) -> Dict[str, Any]:
+    # L'API peut retourner du JSON déjà sérialisé
+    try:
+        return json.loads(text)
+    except Exception:
+        # Certains endpoints retournent une clé 'horaire' contenant 'ICAL' sérialisé
+        return {"horaire": {"ICAL": text}}
+
+# ---- Régénération incrémentale
+EXIT_UNCHANGED = 3  # code de sortie de --incremental quand le XML n'a pas changé
+
+def feed_fingerprint(data: Dict[str, Any]) -> str:
+    """Empreinte du flux d'une salle; horaire.ICAL est haché tel quel (sans le décoder)."""
+    horaire = data.get("horaire") if isinstance(data, dict) else None
+    if isinstance(horaire, dict) and isinstance(horaire.get("ICAL"), str):
+        raw = horaire["ICAL"]
+    else:
+        raw = json.dumps(data, sort_keys=True, ensure_ascii=False)
+    import hashlib
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+class IncrementalState:
+    """Empreinte du flux et événements fusionnés de chaque salle, persistés entre deux exécutions.
+    Les entrées ne sont réutilisées que si les paramètres (fenêtre, décalage, filtre) sont identiques.
+    Sur disque, un jour est une liste de [location, summary, start, end] sous sa clé YYYYMMDD."""
+    VERSION = 2
+
+    def __init__(self, path: str, params: Dict[str, Any]):
+        self.path = Path(path)
+        self.params = params
+        self.rooms: Dict[str, Dict[str, Any]] = {}
+        self.reused = 0
+        self.rebuilt = 0
+        try:
+            raw = json.loads(self.path.read_text(encoding="utf-8"))
+            if raw.get("version") == self.VERSION and raw.get("params") == params:
+                self.rooms = raw.get("rooms", {})
+        except (OSError, ValueError, AttributeError):
+            pass
+
+    @staticmethod
+    def _days(room: Dict[str, Any]) -> Optional[Dict[int, List[Event]]]:
+        days: Dict[int, List[Event]] = {}
+        try:
+            for dkey, rows in room["days"].items():
+                day = date(int(dkey[:4]), int(dkey[4:6]), int(dkey[6:8])).toordinal()
+                days[day] = [Event(day, sys.intern(loc), sys.intern(summary), int(t1), int(t2))
+                             for loc, summary, t1, t2 in rows]
+        except (KeyError, ValueError, TypeError, AttributeError):
+            return None
+        return days
+
+    def lookup(self, salle: str, fingerprint: str) -> Optional[Dict[int, List[Event]]]:
+        room = self.rooms.get(salle)
+        if room is None or room.get("hash") != fingerprint:
+            return None
+        days = self._days(room)
+        if days is not None:
+            self.reused += 1
+        return days
+
+    def last(self, salle: str) -> Optional[Tuple[Dict[int, List[Event]], Optional[float]]]:
+        """Derniers événements enregistrés pour la salle, quel que soit son flux actuel, et leur date
+        (time.time()) : repli quand la salle n'a pas pu être récupérée."""
+        room = self.rooms.get(salle)
+        days = self._days(room) if room is not None else None
+        return None if days is None else (days, room.get("saved_at"))
+
+    def update(self, salle: str, fingerprint: str, days: Dict[int, List[Event]]) -> None:
+        self.rebuilt += 1
+        self.rooms[salle] = {"hash": fingerprint, "saved_at": time.time(),
+                             "days": {ordinal_to_datekey(day): [[e.location, e.summary, e.start, e.end] for e in lst]
+                                      for day, lst in days.items()}}
+
+    def save(self, salles: List[str]) -> None:
+        # seules les salles encore présentes dans le .ini sont conservées
+        rooms = {s: self.rooms[s] for s in salles if s in self.rooms}
+        payload = {"version": self.VERSION, "params": self.params, "rooms": rooms}
+        write_if_changed(self.path, json.dumps(payload, ensure_ascii=False, sort_keys=True).encode("utf-8"))
+
+def write_if_changed(path: Path, data: bytes) -> bool:
+    """Écrit `data` de façon atomique (fichier temporaire + rename) seulement si le contenu diffère.
+    Retourne True si le fichier a été (ré)écrit."""
+    try:
+        if path.stat().st_size == len(data) and path.read_bytes() == data:
+            return False
+    except OSError:
+        pass
+    return write_stream_if_changed(path, lambda f: f.write(data))
+
+def _same_content(a: Path, b: Path, chunk: int = 1 << 16) -> bool:
+    try:
+        if a.stat().st_size != b.stat().st_size:
+            return False
+        with open(a, "rb") as fa, open(b, "rb") as fb:
+            while True:
+                ca = fa.read(chunk)
+                if ca != fb.read(chunk):
+                    return False
+                if not ca:
+                    return True
+    except OSError:
+        return False
+
+def write_stream_if_changed(path: Path, write: Callable[[BinaryIO], None]) -> bool:
+    """Comme write_if_changed, mais le contenu est produit en flux par `write(f)` dans le
+    fichier temporaire (tamponné), comparé ensuite au fichier existant avant le rename."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp, "wb", buffering=1 << 16) as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        if _same_content(tmp, path):
+            tmp.unlink()
+            return False
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            tmp.unlink()
+        except OSError:
+            pass
+        raise
+    return True
+
+# ---- Instantané binaire en colonnes (--snapshot-out / --snapshot-in)
+SNAPSHOT_MAGIC = b"HORSNAP\x00"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_FILTER_LOCATION = 1  # drapeau : créneaux filtrés par salle à l'écriture
+# magic, version, drapeaux, nb salles, nb chaînes, nb créneaux, date de création, crc32 du corps
+_SNAP_HEADER = struct.Struct("<8sIIIIQdI4x")
+
+def _snap_column(mv: memoryview, fmt: str) -> Any:
+    """Vue typée sur une colonne petit-boutiste (copie inversée sur une machine gros-boutiste)."""
+    if sys.byteorder == "little":
+        return mv.cast(fmt)
+    col = array(fmt, mv.tobytes())
+    col.byteswap()
+    return col
+
+class SnapshotWriter:
+    """Accumule les créneaux normalisés de chaque salle (heure locale, sans décalage, sans fenêtre,
+    non fusionnés) et les écrit en un instantané binaire :
+
+        en-tête _SNAP_HEADER, puis colonnes petit-boutistes alignées sur 4 octets :
+        salles u32[n_salles] (index de chaîne), plages u32[2 * n_salles] (début, fin dans les créneaux),
+        day i32[n], start u16[n], end u16[n], location u32[n], summary u32[n],
+        offsets des chaînes u32[n_chaînes + 1], chaînes UTF-8 (complétées à 4 octets).
+
+    Les créneaux de chaque salle sont triés par jour, ce qui permet de ne lire que la fenêtre demandée.
+    Le corps est protégé par un CRC32 et l'écriture est atomique (fichier temporaire + rename)."""
+    def __init__(self, filter_location: bool = True):
+        self.filter_location = filter_location
+        self.rooms: List[Tuple[str, List[Event]]] = []
+        self._shared: Optional[Tuple[Dict[str, Any], List[Event], Dict[str, List[Event]]]] = None
+
+    def add_room(self, salle: str, data: Dict[str, Any]) -> None:
+        if self._shared is not None and self._shared[0] is data:
+            # flux partagé (--bulk) : décodé une seule fois puis réparti par location
+            _, all_slots, index = self._shared
+        else:
+            salle_filter = salle if self.filter_location else None
+            slots = events_from_feed(iter_feed(data, FeedItemFilter(salle_filter)), salle_filter, None, None, 0)
+            self.rooms.append((salle, sorted(slots)))
+            return
+        self.rooms.append((salle, index.get(salle, []) if self.filter_location else all_slots))
+
+    def share(self, data: Dict[str, Any]) -> None:
+        """Déclare `data` comme flux commun à toutes les salles suivantes (--bulk)."""
+        all_slots = sorted(events_from_feed(iter_feed(data), None, None, None, 0))
+        index: Dict[str, List[Event]] = {}
+        for e in all_slots:
+            index.setdefault(e.location, []).append(e)
+        self._shared = (data, all_slots, index)
+
+    def write(self, out: BinaryIO) -> None:
+        strings: Dict[str, int] = {}
+        sid = lambda s: strings.setdefault(s, len(strings))
+        room_ids = array("I", [sid(salle) for salle, _ in self.rooms])
+        ranges, day, start, end, loc, summ = array("I"), array("i"), array("H"), array("H"), array("I"), array("I")
+        seen: Dict[int, Tuple[int, int]] = {}  # une même liste (flux partagé non filtré) n'est écrite qu'une fois
+        for _, slots in self.rooms:
+            rng = seen.get(id(slots))
+            if rng is None:
+                lo = len(day)
+                for e in slots:
+                    day.append(e.day)
+                    start.append(e.start)
+                    end.append(e.end)
+                    loc.append(sid(e.location))
+                    summ.append(sid(e.summary))
+                rng = seen[id(slots)] = (lo, len(day))
+            ranges.extend(rng)
+        blob = io.BytesIO()
+        offsets = array("I", [0])
+        for s in strings:
+            blob.write(s.encode("utf-8"))
+            offsets.append(blob.tell())
+        blob.write(b"\0" * (-blob.tell() % 4))
+        cols = [room_ids, ranges, day, start, end, loc, summ, offsets]
+        if sys.byteorder != "little":
+            for col in cols:
+                col.byteswap()
+        body = b"".join(col.tobytes() for col in cols) + blob.getvalue()
+        flags = SNAPSHOT_FILTER_LOCATION if self.filter_location else 0
+        out.write(_SNAP_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, flags, len(self.rooms), len(strings),
+                                    len(day), time.time(), zlib.crc32(body)))
+        out.write(body)
+
+class Snapshot:
+    """Instantané ouvert en mémoire projetée (mmap); lève ValueError s'il est invalide, tronqué
+    ou d'une autre version. room_days() refait décalage, fenêtre et fusion comme le flux d'origine."""
+    def __init__(self, path: str):
+        import mmap
+        self._file = open(path, "rb")
+        try:
+            size = os.fstat(self._file.fileno()).st_size
+            if size < _SNAP_HEADER.size:
+                raise ValueError(f"instantané tronqué: {path}")
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except BaseException:
+            self._file.close()
+            raise
+        mv = memoryview(self._mm)
+        magic, version, flags, n_rooms, n_strings, n_events, created, crc = _SNAP_HEADER.unpack_from(mv)
+        if magic != SNAPSHOT_MAGIC:
+            self.close()
+            raise ValueError(f"pas un instantané d'horaires: {path}")
+        if version != SNAPSHOT_VERSION:
+            self.close()
+            raise ValueError(f"version d'instantané {version} non supportée (attendu {SNAPSHOT_VERSION})")
+        sizes = [("I", n_rooms), ("I", 2 * n_rooms), ("i", n_events), ("H", n_events), ("H", n_events),
+                 ("I", n_events), ("I", n_events), ("I", n_strings + 1)]
+        pos = _SNAP_HEADER.size
+        cols = []
+        for fmt, n in sizes:
+            nbytes = n * array(fmt).itemsize
+            if pos + nbytes > size:
+                self.close()
+                raise ValueError(f"instantané tronqué: {path}")
+            cols.append((fmt, pos, nbytes))
+            pos += nbytes
+        if zlib.crc32(mv[_SNAP_HEADER.size:]) != crc:
+            self.close()
+            raise ValueError(f"instantané corrompu (CRC): {path}")
+        room_ids, ranges, self._day, self._start, self._end, self._loc, self._summ, offsets = (
+            _snap_column(mv[p:p + n], fmt) for fmt, p, n in cols)
+        blob = mv[pos:]
+        self.strings = [sys.intern(str(blob[offsets[i]:offsets[i + 1]], "utf-8")) for i in range(n_strings)]
+        self.filter_location = bool(flags & SNAPSHOT_FILTER_LOCATION)
+        self.created = created
+        self.n_events = n_events
+        self.rooms: Dict[str, Tuple[int, int]] = {
+            self.strings[room_ids[i]]: (ranges[2 * i], ranges[2 * i + 1]) for i in range(n_rooms)}
+
+    def room_days(self, salle: str, start_date: date, end_date: date,
+                  shift_hours: int, merge_gap: int = 0) -> Dict[int, List[Event]]:
+        rng = self.rooms.get(salle)
+        if rng is None:
+            return {}
+        lo, hi = rng
+        margin = window_margin(shift_hours).days
+        start_ord, end_ord = start_date.toordinal(), end_date.toordinal()
+        day, start, end = self._day, self._start, self._end
+        # créneaux triés par jour : seuls ceux de la fenêtre (± marge du décalage) sont lus
+        i = bisect.bisect_left(day, start_ord - margin, lo, hi)
+        j = bisect.bisect_right(day, end_ord + margin, i, hi)
+        shift = shift_hours * 60
+        strings, loc, summ = self.strings, self._loc, self._summ
+        evts: List[Event] = []
+        for k in range(i, j):
+            d, m = divmod(day[k] * DAY_MINUTES + start[k] + shift, DAY_MINUTES)
+            if start_ord <= d <= end_ord:
+                evts.append(Event(d, strings[loc[k]], strings[summ[k]], m, (end[k] + shift) % DAY_MINUTES))
+        return merged_events_by_date(evts, merge_gap)
+
+    def close(self) -> None:
+        for name in ("_day", "_start", "_end", "_loc", "_summ"):
+            col = self.__dict__.pop(name, None)
+            if isinstance(col, memoryview):
+                col.release()
+        try:
+            self._mm.close()
+        except (AttributeError, BufferError):
+            pass
+        self._file.close()
+
+# ---- Instrumentation (--profile / --metrics-out)
+def peak_rss_bytes() -> Optional[int]:
+    """Pic de mémoire résidente du processus, en octets (None si indisponible)."""
+    try:
+        import resource
+    except ImportError:
+        resource = None
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    if sys.platform == "win32":
+        try:
+            import ctypes
+            from ctypes import wintypes
+
+            class _ProcessMemoryCounters(ctypes.Structure):
+                _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + [
+                    (name, ctypes.c_size_t) for name in (
+                        "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage",
+                        "QuotaPagedPoolUsage", "QuotaPeakNonPagedPoolUsage",
+                        "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage")]
+            counters = _ProcessMemoryCounters()
+            counters.cb = ctypes.sizeof(counters)
+            get_process = ctypes.windll.kernel32.GetCurrentProcess
+            get_process.restype = wintypes.HANDLE
+            if ctypes.windll.psapi.GetProcessMemoryInfo(get_process(), ctypes.byref(counters), counters.cb):
+                return int(counters.PeakWorkingSetSize)
+        except Exception:
+            pass
+    return None
+
+class StageStats:
+    """Cumul d'une étape (globalement ou pour une salle)."""
+    __slots__ = ("calls", "wall_s", "items_in", "items_out", "nbytes")
+
+    def __init__(self):
+        self.calls = 0
+        self.wall_s = 0.0
+        self.items_in = 0
+        self.items_out = 0
+        self.nbytes = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {k: getattr(self, k) for k in self.__slots__}
+
+class TimedIter:
+    """Itérateur qui mesure le temps passé à produire les éléments de `it` (décodage en flux)."""
+    def __init__(self, it: Iterable[Any]):
+        self._it = iter(it)
+        self.seconds = 0.0
+        self.count = 0
+
+    def __iter__(self) -> "TimedIter":
+        return self
+
+    def __next__(self) -> Any:
+        t0 = time.perf_counter()
+        try:
+            item = next(self._it)
+        finally:
+            self.seconds += time.perf_counter() - t0
+        self.count += 1
+        return item
+
+class Metrics:
+    """Temps, appels et volumes (éléments en entrée/sortie, octets) par étape et par salle, et pic de
+    mémoire résidente du processus (une seule valeur : ru_maxrss n'est pas attribuable à une étape).
+    Étapes : fetch (réseau/cache/mock), decode_api (JSON de la réponse), ical_decode (horaire.ICAL),
+    normalize (nettoyage + dates), merge (fusion), write_xml. Utilisable depuis plusieurs threads;
+    avec --workers, les temps de fetch se recouvrent (somme > durée réelle)."""
+    STAGES = ("fetch", "decode_api", "ical_decode", "normalize", "merge", "write_xml")
+    VERSION = 2  # 2 : plus de peak_rss par étape, seulement au niveau du processus
+
+    def __init__(self, rooms: Iterable[str] = ()):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, StageStats] = {}
+        # salles pré-enregistrées : rapport dans l'ordre du .ini, quel que soit l'ordre d'achèvement
+        self.rooms: Dict[str, Dict[str, StageStats]] = {room: {} for room in rooms}
+        self.room_status: Dict[str, str] = {}
+        self.extra: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float, room: Optional[str] = None,
+            items_in: int = 0, items_out: int = 0, nbytes: int = 0) -> None:
+        with self._lock:
+            targets = [self.stages.setdefault(stage, StageStats())]
+            if room is not None:
+                targets.append(self.rooms.setdefault(room, {}).setdefault(stage, StageStats()))
+            for st in targets:
+                st.calls += 1
+                st.wall_s += seconds
+                st.items_in += items_in
+                st.items_out += items_out
+                st.nbytes += nbytes
+
+    def set_status(self, room: str, status: str) -> None:
+        with self._lock:
+            self.room_status[room] = status
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:  # peut être lu pendant la génération (RunHooks)
+            return {
+                "version": self.VERSION,
+                "total_s": time.perf_counter() - self.started,
+                "peak_rss": peak_rss_bytes(),
+                "stages": {name: st.as_dict() for name, st in self.stages.items()},
+                "rooms": {room: {"status": self.room_status.get(room),
+                                 "stages": {name: st.as_dict() for name, st in stages.items()}}
+                          for room, stages in self.rooms.items()},
+                **self.extra,
+            }
+
+    def report(self) -> str:
+        """Tableau récapitulatif (--profile)."""
+        def mb(n: Optional[int]) -> str:
+            return "-" if n is None else f"{n / 2**20:.1f}"
+        lines = [f"{'étape':<12} {'appels':>7} {'temps (s)':>10} {'entrée':>9} {'sortie':>9} {'octets':>11}"]
+        names = [n for n in self.STAGES if n in self.stages] + sorted(set(self.stages) - set(self.STAGES))
+        for name in names:
+            st = self.stages[name]
+            lines.append(f"{name:<12} {st.calls:>7} {st.wall_s:>10.3f} {st.items_in:>9} {st.items_out:>9} "
+                         f"{st.nbytes:>11}")
+        lines.append("")
+        lines.append(f"{'salle':<32} {'statut':<12} {'fetch (s)':>10} {'calcul (s)':>10} {'octets':>11} "
+                     f"{'créneaux':>9} {'événements':>10}")
+        for room, stages in self.rooms.items():
+            fetch = stages.get("fetch", StageStats())
+            compute = sum(stages[n].wall_s for n in ("decode_api", "ical_decode", "normalize", "merge") if n in stages)
+            slots = stages["ical_decode"].items_out if "ical_decode" in stages else 0
+            out = stages["merge"].items_out if "merge" in stages else 0
+            lines.append(f"{room[:32]:<32} {self.room_status.get(room, '-'):<12} {fetch.wall_s:>10.3f} "
+                         f"{compute:>10.3f} {fetch.nbytes:>11} {slots:>9} {out:>10}")
+        lines.append("")
+        lines.append(f"total {time.perf_counter() - self.started:.3f} s, pic RSS {mb(peak_rss_bytes())} Mo")
+        return "\n".join(lines)
+
+class GenerationCancelled(Exception):
+    """Génération interrompue à la demande (RunHooks.cancel)."""
+
+class RunHooks:
+    """Suivi d'une génération lancée depuis une autre application (interface graphique) :
+    main(argv, hooks). room_done() est appelé après chaque salle, depuis le thread de main();
+    `cancel` interrompt la génération au prochain point de contrôle (avant l'écriture des XML)
+    et `metrics` donne les mesures par étape pendant l'exécution."""
+    def __init__(self) -> None:
+        self.cancel = threading.Event()
+        self.metrics: Optional[Metrics] = None
+
+    def room_done(self, salle: str, done: int, total: int) -> None:
+        pass
+
+    def check(self) -> None:
+        if self.cancel.is_set():
+            raise GenerationCancelled()
 
 def fetch_for_salle(api_url: Optional[str], salle: str,
                     mock_path: Optional[str], mock_dir: Optional[str],
-                    verbose: bool=False) -> Dict[str, Any]:
-    """Retourne le JSON pour une salle (mock-dir > mock > POST API)."""
+                    verbose: bool=False,
+                    limiter: Optional[HostLimiter] = None,
+                    client: Optional[HttpClient] = None,
+                    cache: Optional[ResponseCache] = None,
+                    offline: bool = False,
+                    metrics: Optional["Metrics"] = None,
+                    cancel: Optional[threading.Event] = None,
+                    deadline: Optional[float] = None,
+                    room_timeout: Optional[float] = None) -> Dict[str, Any]:
+    """Retourne le JSON pour une salle (cache frais > mock-dir > mock > POST API).
+    En mode `offline`, seul le cache est consulté (même périmé). La requête s'arrête à la plus
+    proche de `deadline` (time.monotonic()) et de maintenant + `room_timeout` secondes."""
+    if cancel is not None and cancel.is_set():
+        raise GenerationCancelled()  # salles encore en file d'attente du pool : abandon immédiat
+    if room_timeout is not None:
+        limit = time.monotonic() + room_timeout
+        deadline = limit if deadline is None else min(deadline, limit)
+    if deadline is not None and time.monotonic() >= deadline:
+        raise TimeoutError(f"échéance atteinte avant {salle}")
+    t0 = time.perf_counter()
+    text, from_mock, nbytes = _fetch_text(api_url, salle, mock_path, mock_dir, verbose, limiter, client, cache,
+                                          offline, deadline)
+    t1 = time.perf_counter()
+    data = json.loads(text) if from_mock else _decode_api_text(text)
+    if metrics is not None:
+        metrics.add("fetch", t1 - t0, room=salle, nbytes=nbytes)
+        metrics.add("decode_api", time.perf_counter() - t1, room=salle)
+    return data
+
+def _fetch_text(api_url: Optional[str], salle: str,
+                mock_path: Optional[str], mock_dir: Optional[str],
+                verbose: bool, limiter: Optional[HostLimiter], client: Optional[HttpClient],
+                cache: Optional[ResponseCache], offline: bool,
+                deadline: Optional[float] = None) -> Tuple[str, bool, int]:
+    """Texte brut de la réponse d'une salle, True s'il vient d'un mock (JSON strict), et sa taille
+    en octets telle que la connaît la source (fichier, cache, corps HTTP) : rien n'est réencodé."""
+    cached: Optional[CacheEntry] = None
+    if cache is not None and api_url:
+        cached = cache.load(api_url, salle)
+        if cached is not None and (offline or cache.is_fresh(cached)):
+            cache.count(hit=True, saved=cached.nbytes)
+            if verbose:
+                print(f"[cache] {salle} (hit)")
+            return cached.text, False, cached.nbytes
+    if offline:
+        raise LookupError(f"--offline : aucune réponse en cache pour {salle}")
     # mock-dir prioritaire
     if mock_dir:
         cand_json = Path(mock_dir) / (salle + ".json")
@@ -225,78 +1331,1014 @@ def fetch_for_salle(api_url: Optional[str], salle: str,
             if cand.exists():
                 if verbose:
                     print(f"[mock-dir] {salle} <- {cand}")
-                return json.loads(cand.read_text(encoding="utf-8"))
+                raw = cand.read_bytes()
+                return raw.decode("utf-8"), True, len(raw)
     # mock unique
     if mock_path:
         if verbose:
             print(f"[mock] {salle} <- {mock_path}")
-        return json.loads(Path(mock_path).read_text(encoding="utf-8"))
+        raw = Path(mock_path).read_bytes()
+        return raw.decode("utf-8"), True, len(raw)
     # API réelle
     assert api_url, "api_url requis si pas de mock/mock-dir"
     if verbose:
         print(f"[api] POST {salle}")
-    text = http_post_text(api_url, {"action": "getHoraireSalle", "codeSalle": salle})
-    # L'API peut retourner du JSON déjà sérialisé
+    form = {"action": "getHoraireSalle", "codeSalle": salle}
+    headers: Dict[str, str] = {}
+    if cached is not None:
+        if cached.etag:
+            headers["If-None-Match"] = cached.etag
+        if cached.last_modified:
+            headers["If-Modified-Since"] = cached.last_modified
+    assert client is not None, "client HTTP requis pour l'API"
+    if limiter is not None:
+        sem = limiter.slot(api_url)
+        wait = None if deadline is None else max(0.0, deadline - time.monotonic())
+        if not sem.acquire(timeout=wait):
+            raise TimeoutError(f"échéance atteinte en attente d'une connexion pour {salle}")
+        try:
+            resp = client.post(api_url, form, headers=headers, deadline=deadline)
+        finally:
+            sem.release()
+    else:
+        resp = client.post(api_url, form, headers=headers, deadline=deadline)
+    if resp.status == 304 and cached is not None:
+        cache.store(api_url, salle, cached.text, cached.nbytes, resp.headers.get("etag", cached.etag),
+                    resp.headers.get("last-modified", cached.last_modified))
+        cache.count(hit=True, saved=cached.nbytes, revalidated=True)
+        if verbose:
+            print(f"[cache] {salle} (304, revalidé)")
+        return cached.text, False, cached.nbytes
+    if resp.status == 304:
+        raise HttpError(f"HTTP 304 inattendu pour {salle}", status=304)
+    if cache is not None:
+        cache.store(api_url, salle, resp.text, resp.nbytes, resp.headers.get("etag"),
+                    resp.headers.get("last-modified"))
+        cache.count(hit=False)
+    return resp.text, False, resp.nbytes
+
+def iter_fetch_salles(api_url: Optional[str], salles: List[str],
+                      mock_path: Optional[str], mock_dir: Optional[str],
+                      workers: int = 1, per_host: int = 4, isolate: bool = False,
+                      **fetch_kwargs: Any) -> Iterator[Tuple[str, Any]]:
+    """Produit (salle, JSON) dans l'ordre de `salles`, quel que soit l'ordre d'achèvement.
+    Avec workers > 1, les salles sont récupérées en parallèle (pool de threads borné,
+    au plus `per_host` requêtes simultanées vers l'API). `fetch_kwargs` est transmis
+    à fetch_for_salle (verbose, client, cache, offline, metrics, cancel, deadline, room_timeout).
+    Avec `isolate`, une salle en échec produit son exception à la place du JSON et les autres
+    continuent; passé `deadline`, les salles encore en attente produisent TimeoutError."""
+    deadline: Optional[float] = fetch_kwargs.get("deadline")
+
+    def fetch(salle: str, limiter: Optional[HostLimiter] = None) -> Any:
+        try:
+            return fetch_for_salle(api_url, salle, mock_path, mock_dir, limiter=limiter, **fetch_kwargs)
+        except GenerationCancelled:
+            raise
+        except Exception as e:
+            if not isolate:
+                raise
+            return e
+
+    if workers <= 1 or len(salles) <= 1:
+        for salle in salles:
+            yield salle, fetch(salle)
+        return
+    from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+    limiter = HostLimiter(per_host)
+    pool = ThreadPoolExecutor(max_workers=min(workers, len(salles)))
+    futures: List["Future[Any]"] = []
     try:
-        return json.loads(text)
-    except Exception:
-        # Certains endpoints retournent une clé 'horaire' contenant 'ICAL' sérialisé
-        return {"horaire": {"ICAL": text}}
+        # résultats restitués dans l'ordre de soumission -> sortie déterministe
+        futures.extend(pool.submit(fetch, s, limiter) for s in salles)
+        for salle, fut in zip(salles, futures):
+            if deadline is None or not isolate:
+                yield salle, fut.result()
+                continue
+            try:
+                yield salle, fut.result(timeout=max(0.0, deadline - time.monotonic()))
+            except FutureTimeout:
+                yield salle, TimeoutError(f"échéance atteinte avant la réponse de {salle}")
+    finally:
+        for fut in futures:
+            fut.cancel()
+        # une requête bloquée au-delà de l'échéance n'est pas attendue (elle se termine seule)
+        pool.shutdown(wait=deadline is None)
+
+def room_events(data: Dict[str, Any], salle_filter: Optional[str],
+                start_date: date, end_date: date, shift_hours: int,
+                metrics: Optional[Metrics] = None, salle: Optional[str] = None) -> List[Event]:
+    """Réponse décodée d'une salle -> événements non fusionnés de la fenêtre (ical_decode, normalize)."""
+    feed: Iterable[Dict[str, Any]] = iter_feed(data, FeedItemFilter(salle_filter, start_date, end_date, shift_hours))
+    return normalized_events(feed, salle_filter, start_date, end_date, shift_hours, metrics, salle)
+
+def normalized_events(feed: Iterable[Dict[str, Any]], salle_filter: Optional[str],
+                      start_date: date, end_date: date, shift_hours: int,
+                      metrics: Optional[Metrics] = None, salle: Optional[str] = None) -> List[Event]:
+    """events_from_feed, avec mesure séparée du décodage (ical_decode) et de la normalisation."""
+    if metrics is None:
+        return events_from_feed(feed, salle_filter, start_date, end_date, shift_hours)
+    feed = timed = TimedIter(feed)
+    t0 = time.perf_counter()
+    evts = events_from_feed(feed, salle_filter, start_date, end_date, shift_hours)
+    t1 = time.perf_counter()
+    metrics.add("ical_decode", timed.seconds, room=salle, items_out=timed.count)
+    metrics.add("normalize", t1 - t0 - timed.seconds, room=salle, items_in=timed.count, items_out=len(evts))
+    return evts
+
+def timed_merge(evts: List[Event], merge_gap: int = 0, metrics: Optional[Metrics] = None,
+                salle: Optional[str] = None) -> Dict[int, List[Event]]:
+    """merged_events_by_date, mesuré (merge) si `metrics` est fourni."""
+    t0 = time.perf_counter()
+    days = merged_events_by_date(evts, merge_gap)
+    if metrics is not None:
+        metrics.add("merge", time.perf_counter() - t0, room=salle, items_in=len(evts),
+                    items_out=sum(map(len, days.values())))
+    return days
+
+def room_events_by_date(data: Dict[str, Any], salle_filter: Optional[str],
+                        start_date: date, end_date: date, shift_hours: int, merge_gap: int = 0,
+                        metrics: Optional[Metrics] = None, salle: Optional[str] = None) -> Dict[int, List[Event]]:
+    """Réponse décodée d'une salle -> événements fusionnés par jour (ical_decode, normalize, merge)."""
+    evts = room_events(data, salle_filter, start_date, end_date, shift_hours, metrics, salle)
+    return timed_merge(evts, merge_gap, metrics, salle)
+
+# ---- Découpe du flux --bulk en morceaux de créneaux consécutifs (un par processus)
+_FEED_HEAD = re.compile(r'[ \t\n\r]*\{[ \t\n\r]*"feed"[ \t\n\r]*:[ \t\n\r]*\[')
+_FEED_TAIL = re.compile(r'\][ \t\n\r]*\}[ \t\n\r]*\Z')
+_ITEM_SEP = re.compile(r'\}[ \t\n\r]*,[ \t\n\r]*\{')
+
+def _outside_string(s: str, lo: int, hi: int) -> bool:
+    """s[lo] étant hors d'une chaîne JSON, s[hi] l'est aussi : nombre pair de guillemets
+    non échappés entre les deux."""
+    if s.find("\\", lo, hi) < 0:
+        return s.count('"', lo, hi) % 2 == 0
+    return s[lo:hi].replace("\\\\", "").replace('\\"', "").count('"') % 2 == 0
+
+def split_feed(data: Dict[str, Any], parts: int) -> Optional[List[Union[str, List[Dict[str, Any]]]]]:
+    """Découpe le tableau 'feed' en au plus `parts` morceaux de taille voisine, chacun décodable seul :
+    sous-listes de struct['feed'], ou tranches de la chaîne horaire.ICAL coupées entre deux créneaux.
+
+    Seul un ICAL de la forme {"feed": [...]} est découpé (None sinon : traitement en un processus).
+    Une coupure mal placée (objet imbriqué) est détectée par _iter_feed_slice, pas ignorée."""
+    if not isinstance(data, dict):
+        return None
+    horaire = data.get("horaire")
+    if not (isinstance(horaire, dict) and "ICAL" in horaire):
+        feed = data.get("feed")
+        if not isinstance(feed, list):
+            return None
+        size = -(-len(feed) // max(1, parts)) or 1
+        return [feed[i:i + size] for i in range(0, len(feed), size)]
+    s = horaire["ICAL"]
+    if not isinstance(s, str):
+        return None
+    head, tail = _FEED_HEAD.match(s), _FEED_TAIL.search(s)
+    if head is None or tail is None or tail.start() < head.end():
+        return None
+    lo, hi = head.end(), tail.start()
+    cuts = [lo]
+    for k in range(1, parts):
+        m = _ITEM_SEP.search(s, max(cuts[-1], lo + (hi - lo) * k // parts), hi)
+        while m is not None and not _outside_string(s, cuts[-1], m.start()):
+            m = _ITEM_SEP.search(s, m.start() + 1, hi)
+        if m is None:
+            break
+        cuts.append(m.end() - 1)  # '{' du créneau suivant
+    cuts.append(hi)
+    return [s[a:b] for a, b in zip(cuts, cuts[1:])]
+
+def _iter_feed_slice(s: str, decoder: json.JSONDecoder) -> Iterator[Any]:
+    """Créneaux d'une tranche de split_feed : objets séparés par des virgules jusqu'à la fin exacte
+    de la tranche (virgule finale admise). Toute autre forme lève ValueError (coupure invalide)."""
+    end = len(s)
+    idx = _JSON_WS.match(s, 0).end()
+    while idx < end:
+        if s[idx] != "{":
+            raise ValueError(f"tranche de flux invalide à la position {idx}")
+        item, idx = decoder.raw_decode(s, idx)
+        yield item
+        idx = _JSON_WS.match(s, idx).end()
+        if idx < end:
+            if s[idx] != ",":
+                raise ValueError(f"tranche de flux invalide à la position {idx}")
+            idx = _JSON_WS.match(s, idx + 1).end()
+
+class BulkFeed:
+    """Flux partagé par plusieurs salles (--bulk) : décodé, normalisé et fusionné une seule fois,
+    puis indexé par location nettoyée; chaque salle obtient sa partition en O(1).
+    Le résultat est identique à celui du traitement salle par salle du même flux."""
+    def __init__(self, data: Dict[str, Any], filter_location: bool, start_date: date, end_date: date,
+                 shift_hours: int, merge_gap: int = 0, metrics: Optional[Metrics] = None,
+                 pool: "Optional[ProcessPoolExecutor]" = None, parts: int = 1):
+        self.data = data
+        self.pool = pool
+        self.parts = parts
+        self.filter_location = filter_location
+        self.window = (start_date, end_date, shift_hours, merge_gap)
+        self.metrics = metrics
+        self._all: Optional[Dict[int, List[Event]]] = None
+        self._index: Dict[str, Dict[int, List[Event]]] = {}
+
+    def _build(self) -> None:
+        start_date, end_date, shift_hours, merge_gap = self.window
+        label = "(bulk)" if self.metrics is not None else None
+        slices = split_feed(self.data, self.parts) if self.pool is not None and self.parts > 1 else None
+        self._all = None
+        if slices is not None and len(slices) > 1:
+            # une tranche du flux par processus : chacun ne reçoit et ne décode que sa part;
+            # la fusion, qui peut réunir des créneaux de tranches voisines, reste ici
+            jobs = [self.pool.submit(feed_slice_job, part, start_date, end_date, shift_hours,
+                                     self.metrics is not None)
+                    for part in slices]
+            try:
+                results = [job.result() for job in jobs]
+            except ValueError:
+                results = None  # coupure dans un objet imbriqué : flux traité d'un seul tenant
+            if results is not None:
+                evts: List[Event] = []
+                for result in results:
+                    for lst in collect_result(result, self.metrics, label).values():
+                        evts.extend(lst)
+                self._all = timed_merge(evts, merge_gap, self.metrics, label)
+        if self._all is None:
+            self._all = room_events_by_date(self.data, None, start_date, end_date, shift_hours, merge_gap,
+                                            metrics=self.metrics, salle=label)
+        index = self._index
+        for day, lst in self._all.items():
+            for e in lst:
+                room = index.get(e.location)
+                if room is None:
+                    room = index[e.location] = {}
+                room_day = room.get(day)
+                if room_day is None:
+                    room_day = room[day] = []
+                room_day.append(e)
+        self.data = {}  # le JSON brut n'est plus nécessaire
+
+    def room(self, salle: str) -> Dict[int, List[Event]]:
+        """Événements fusionnés par jour de `salle` (tout le flux sans filtre par salle)."""
+        if self._all is None:
+            self._build()
+        if not self.filter_location:
+            return self._all
+        return self._index.get(salle, {})
+
+# ---- Traitement multi-processus (--processes) : résultats renvoyés sous forme compacte
+PackedDays = Tuple[List[str], bytes]
 
-def main():
-    p = argparse.ArgumentParser(description="Génère un XML d'horaires (7 jours) à partir d'une API Henallux ou de mocks.")
-    p.add_argument("--salles", required=True, help="Fichier .ini listant les salles (chemin relatif OK).")
-    p.add_argument("--out", required=True, help="Fichier XML de sortie (chemin relatif OK).")
+def pack_days(days: Dict[int, List[Event]]) -> PackedDays:
+    """(table des chaînes, array('i') de (day, location, summary, start, end) en octets) :
+    bien moins coûteux à sérialiser entre processus qu'une liste de NamedTuple."""
+    return pack_events(itertools.chain.from_iterable(days.values()))
+
+def pack_events(evts: Iterable[Event]) -> PackedDays:
+    """pack_days d'une simple suite d'événements (unpack_days les regroupe par jour)."""
+    strings: Dict[str, int] = {}
+    rows = array("i")
+    for e in evts:
+        rows.extend((e.day, strings.setdefault(e.location, len(strings)),
+                     strings.setdefault(e.summary, len(strings)), e.start, e.end))
+    return list(strings), rows.tobytes()
+
+def unpack_days(packed: PackedDays) -> Dict[int, List[Event]]:
+    """Inverse de pack_days; l'ordre des jours et des événements est conservé."""
+    names, raw = packed
+    strings = [sys.intern(x) for x in names]
+    rows = array("i")
+    rows.frombytes(raw)
+    days: Dict[int, List[Event]] = {}
+    for i in range(0, len(rows), 5):
+        day = rows[i]
+        lst = days.get(day)
+        if lst is None:
+            lst = days[day] = []
+        lst.append(Event(day, strings[rows[i + 1]], strings[rows[i + 2]], rows[i + 3], rows[i + 4]))
+    return days
+
+def room_events_job(data: Dict[str, Any], salle_filter: Optional[str], start_date: date, end_date: date,
+                    shift_hours: int, merge_gap: int = 0,
+                    with_metrics: bool = False) -> Tuple[PackedDays, List[Tuple[str, float, int, int]]]:
+    """room_events_by_date exécuté dans un processus du pool; retourne les événements compactés
+    et, si demandé, les mesures par étape (étape, temps, entrée, sortie)."""
+    metrics = Metrics() if with_metrics else None
+    days = room_events_by_date(data, salle_filter, start_date, end_date, shift_hours, merge_gap, metrics=metrics)
+    stages = [(name, st.wall_s, st.items_in, st.items_out) for name, st in metrics.stages.items()] if metrics else []
+    return pack_days(days), stages
+
+def feed_slice_job(part: Union[str, List[Dict[str, Any]]], start_date: date, end_date: date, shift_hours: int,
+                   with_metrics: bool = False) -> Tuple[PackedDays, List[Tuple[str, float, int, int]]]:
+    """Tranche de split_feed décodée et normalisée dans un processus du pool, sans fusion;
+    ValueError si la tranche n'est pas une suite de créneaux complets."""
+    metrics = Metrics() if with_metrics else None
+    if isinstance(part, str):
+        decoder = json.JSONDecoder(object_pairs_hook=FeedItemFilter(None, start_date, end_date, shift_hours))
+        feed: Iterable[Dict[str, Any]] = (it for it in _iter_feed_slice(part, decoder) if isinstance(it, dict))
+    else:
+        feed = part
+    evts = normalized_events(feed, None, start_date, end_date, shift_hours, metrics)
+    stages = [(name, st.wall_s, st.items_in, st.items_out) for name, st in metrics.stages.items()] if metrics else []
+    return pack_events(evts), stages
+
+def collect_job(future: "Future[Any]", metrics: Optional[Metrics], room: Optional[str]) -> Dict[int, List[Event]]:
+    return collect_result(future.result(), metrics, room)
+
+def collect_result(result: Tuple[PackedDays, List[Tuple[str, float, int, int]]], metrics: Optional[Metrics],
+                   room: Optional[str]) -> Dict[int, List[Event]]:
+    """Mesures d'un job ajoutées à `metrics` (étiquetées `room`), événements décompactés."""
+    packed, stages = result
+    if metrics is not None:
+        for name, wall, n_in, n_out in stages:
+            metrics.add(name, wall, room=room, items_in=n_in, items_out=n_out)
+    return unpack_days(packed)
+
+def window_for(args: "argparse.Namespace") -> Tuple[date, date]:
+    """Fenêtre [start_date, end_date] de la génération (--start / --days, aujourd'hui par défaut)."""
+    tz = local_tz()
+    today = datetime.now(tz).date() if tz else datetime.now().date()
+    start_date = args.start or today
+    return start_date, start_date + timedelta(days=args.days - 1)
+
+# ---- Repli par salle (échec, --room-timeout, --deadline)
+EXIT_DEGRADED = 4  # XML produit, mais au moins une salle périmée ou absente
+
+class RoomReport(NamedTuple):
+    status: str                 # "fresh", "stale" (repli) ou "missing"
+    source: Optional[str]       # origine du repli : "cache" ou "state"
+    error: Optional[str]        # cause de l'échec
+    age_s: Optional[float]      # âge des données de repli, si connu
+
+class RoomFallback:
+    """Repli d'une salle qui n'a pas pu être récupérée ou calculée : dernière réponse reçue de
+    l'API (cache, même périmé) recalculée pour la fenêtre courante, sinon derniers événements
+    enregistrés par --incremental, sinon salle absente du XML. Tient le rapport par salle."""
+    LABELS = {"fresh": "à jour", "stale": "périmée", "missing": "absente"}
+
+    def __init__(self, api_url: Optional[str], cache: Optional[ResponseCache], state: Optional[IncrementalState],
+                 filter_location: bool, window: Tuple[date, date, int, int],
+                 metrics: Optional[Metrics] = None):
+        self.api_url = api_url
+        self.cache = cache
+        self.state = state
+        self.filter_location = filter_location
+        self.window = window
+        self.metrics = metrics
+        self.rooms: Dict[str, RoomReport] = {}
+        self.shared: Optional[RoomReport] = None  # --bulk : flux commun servi depuis le cache
+
+    def _set(self, salle: str, report: RoomReport) -> None:
+        self.rooms[salle] = report
+        if self.metrics is not None and report.status != "fresh":
+            self.metrics.set_status(salle, self.LABELS[report.status])
+
+    def _stale_feed(self, code: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        if self.cache is None or not self.api_url:
+            return None
+        entry = self.cache.load(self.api_url, code)
+        if entry is None:
+            return None
+        return _decode_api_text(entry.text), time.time() - entry.fetched_at
+
+    def ok(self, salle: str) -> None:
+        self._set(salle, self.shared or RoomReport("fresh", None, None, None))
+
+    def missing(self, salle: str, error: str) -> None:
+        self._set(salle, RoomReport("missing", None, error, None))
+
+    def shared_feed(self, code: str, error: BaseException) -> Optional[Dict[str, Any]]:
+        """--bulk : flux commun de repli (cache), None s'il n'y en a pas."""
+        stale = self._stale_feed(code)
+        if stale is None:
+            return None
+        self.shared = RoomReport("stale", "cache", f"{type(error).__name__}: {error}", stale[1])
+        return stale[0]
+
+    def recover(self, salle: str, error: BaseException) -> Dict[int, List[Event]]:
+        err = f"{type(error).__name__}: {error}"
+        start_date, end_date, shift_hours, merge_gap = self.window
+        try:
+            stale = self._stale_feed(salle)
+            if stale is not None:
+                days = room_events_by_date(stale[0], salle if self.filter_location else None,
+                                           start_date, end_date, shift_hours, merge_gap)
+                self._set(salle, RoomReport("stale", "cache", err, stale[1]))
+                return days
+        except Exception:
+            pass  # réponse en cache illisible : repli suivant
+        last = self.state.last(salle) if self.state is not None else None
+        if last is not None:
+            days, saved_at = last
+            self._set(salle, RoomReport("stale", "state", err, None if saved_at is None else time.time() - saved_at))
+            return days
+        self._set(salle, RoomReport("missing", None, err, None))
+        return {}
+
+    def degraded(self) -> bool:
+        return any(r.status != "fresh" for r in self.rooms.values())
+
+    def counts(self) -> Dict[str, int]:
+        counts = {status: 0 for status in self.LABELS}
+        for r in self.rooms.values():
+            counts[r.status] += 1
+        return counts
+
+    def lines(self) -> List[str]:
+        """Une ligne par salle périmée ou absente."""
+        out = []
+        for salle, r in self.rooms.items():
+            if r.status == "fresh":
+                continue
+            age = f", {r.age_s / 3600:.1f} h" if r.age_s is not None else ""
+            origin = f" ({r.source}{age})" if r.source else ""
+            out.append(f"[repli] {salle} : {self.LABELS[r.status]}{origin} - {r.error}")
+        return out
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"counts": self.counts(),
+                "rooms": {salle: {"status": r.status, "source": r.source, "error": r.error,
+                                  "age_s": None if r.age_s is None else round(r.age_s, 1)}
+                          for salle, r in self.rooms.items()}}
+
+# ---- Sorties multiples : un XML par section du fichier de salles
+class TargetResult(NamedTuple):
+    path: Path
+    changed: bool
+    n_events: int
+
+def write_targets(out: str, targets: Dict[str, List[str]], room_days: Dict[str, Dict[int, List[Event]]],
+                  start_date: date, n_days: int, include_empty_days: bool, eol: str,
+                  metrics: Optional[Metrics] = None, max_workers: int = 4) -> Dict[str, TargetResult]:
+    """Écrit le XML de chaque cible à partir des événements déjà normalisés de ses salles
+    (partagés entre cibles, jamais recalculés). Plusieurs cibles s'écrivent en parallèle."""
+    def write_one(rooms: List[str], path: Path) -> TargetResult:
+        t0 = time.perf_counter()
+        buckets = DayBuckets(start_date, n_days)
+        for salle in rooms:
+            for lst in room_days.get(salle, {}).values():
+                buckets.extend(lst)
+        if include_empty_days:
+            buckets.fill_empty()
+        changed = write_stream_if_changed(path, lambda f: write_xml(f, buckets, EOLS[eol]))
+        n_events = sum(len(lst) for _, lst in buckets.items())
+        if metrics is not None:
+            metrics.add("write_xml", time.perf_counter() - t0, items_in=n_events, nbytes=path.stat().st_size)
+        return TargetResult(path, changed, n_events)
+
+    paths = {name: target_path(out, name) for name in targets}
+    if len(targets) <= 1 or max_workers <= 1:
+        return {name: write_one(rooms, paths[name]) for name, rooms in targets.items()}
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(targets))) as ex:
+        futures = {name: ex.submit(write_one, rooms, paths[name]) for name, rooms in targets.items()}
+        return {name: fut.result() for name, fut in futures.items()}
+
+def write_occupancy_targets(out: str, targets: Dict[str, List[str]],
+                            room_days: Dict[str, Dict[int, List[Event]]], start_date: date, n_days: int,
+                            preheat: int, postheat: int, eol: str,
+                            metrics: Optional[Metrics] = None) -> Dict[str, TargetResult]:
+    """--occupancy-out : un fichier par cible si `out` contient {target}, sinon un seul fichier
+    pour toutes les salles distinctes."""
+    if "{target}" not in out:
+        targets = {"": list(dict.fromkeys(s for rooms in targets.values() for s in rooms))}
+    results = {}
+    for name, rooms in targets.items():
+        t0 = time.perf_counter()
+        path = target_path(out, name)
+        spans = [0]
+
+        def write(f: BinaryIO, rooms: List[str] = rooms) -> None:
+            spans[0] = write_occupancy(f, rooms, room_days, start_date, n_days, preheat, postheat, EOLS[eol])
+
+        changed = write_stream_if_changed(path, write)
+        if metrics is not None:
+            metrics.add("occupancy", time.perf_counter() - t0, items_out=spans[0], nbytes=path.stat().st_size)
+        results[name] = TargetResult(path, changed, spans[0])
+    return results
+
+# ---- Mode résident (--daemon)
+class RoomState:
+    """Dernier résultat connu d'une salle en mode résident."""
+    __slots__ = ("fingerprint", "params", "days", "last_ok", "last_error", "latency_s", "failures")
+
+    def __init__(self):
+        self.fingerprint: Optional[str] = None
+        self.params: Optional[Tuple[Any, ...]] = None
+        self.days: Dict[int, List[Event]] = {}
+        self.last_ok: Optional[float] = None     # epoch du dernier rafraîchissement réussi
+        self.last_error: Optional[str] = None
+        self.latency_s = 0.0
+        self.failures = 0                        # échecs consécutifs
+
+class Daemon:
+    """Reste résident et rafraîchit toutes les salles toutes les `--interval` secondes.
+
+    Les requêtes d'un cycle sont étalées sur `--stagger` x interval pour lisser la charge de
+    l'API; le client HTTP (connexions keep-alive) et les événements de chaque salle sont
+    conservés d'un cycle à l'autre : un flux inchangé n'est pas recalculé, une salle en échec
+    garde ses derniers événements. salles.ini est relu quand il change, le XML n'est réécrit
+    que si son contenu change, et l'état est publié dans --status-file et/ou sur
+    http://127.0.0.1:<--status-port>/status."""
+    def __init__(self, args: "argparse.Namespace", client: HttpClient, cache: Optional[ResponseCache]):
+        self.args = args
+        self.client = client
+        self.cache = cache
+        self.salles: List[str] = []
+        self.targets: Dict[str, List[str]] = {}
+        self.rooms: Dict[str, RoomState] = {}
+        self.stop = threading.Event()
+        self.started = time.time()
+        self.cycles = 0
+        self.reloads = 0
+        self.last_cycle: Dict[str, Any] = {}
+        self._salles_mtime: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def log(self, msg: str) -> None:
+        if self.args.verbose:
+            print(f"[daemon] {time.strftime('%H:%M:%S')} {msg}", flush=True)
+
+    def reload_salles(self) -> None:
+        try:
+            mtime = os.stat(self.args.salles).st_mtime_ns
+            if mtime == self._salles_mtime:
+                return
+            targets = load_targets_ini(self.args.salles)
+            salles = load_salles_ini(self.args.salles)
+        except (OSError, ValueError) as e:
+            self.log(f"lecture de {self.args.salles} impossible ({e}), liste précédente conservée")
+            return
+        if not salles:
+            self.log(f"aucune salle dans {self.args.salles}, liste précédente conservée")
+            return
+        err = check_targets(targets, self.args.out, self.args.occupancy_out)
+        if err:
+            self.log(f"{err}, liste précédente conservée")
+            return
+        with self._lock:
+            if self._salles_mtime is not None:
+                self.reloads += 1
+                self.log(f"{self.args.salles} rechargé : {len(salles)} salle(s)")
+            self._salles_mtime = mtime
+            self.salles, self.targets = salles, targets
+            self.rooms = {s: self.rooms.get(s) or RoomState() for s in salles}
+
+    def refresh_room(self, salle: str, start_date: date, end_date: date,
+                     metrics: Optional[Metrics]) -> None:
+        args = self.args
+        room = self.rooms[salle]
+        params = (start_date, end_date, args.shift_hours, args.no_filter_location, args.merge_gap)
+        t0 = time.perf_counter()
+        try:
+            data = fetch_for_salle(args.api, salle, args.mock, args.mock_dir, verbose=args.verbose,
+                                   client=self.client, cache=self.cache, offline=args.offline, metrics=metrics,
+                                   room_timeout=args.room_timeout)
+            fingerprint = feed_fingerprint(data)
+            if fingerprint != room.fingerprint or params != room.params:
+                days = room_events_by_date(data, None if args.no_filter_location else salle, start_date, end_date,
+                                           args.shift_hours, args.merge_gap, metrics=metrics, salle=salle)
+                with self._lock:
+                    room.fingerprint, room.params, room.days = fingerprint, params, days
+            with self._lock:
+                room.last_ok, room.last_error, room.failures = time.time(), None, 0
+        except Exception as e:  # un démon ne s'arrête pas pour une salle en erreur
+            with self._lock:
+                room.last_error = f"{type(e).__name__}: {e}"
+                room.failures += 1
+            self.log(f"{salle} en échec ({room.last_error}), derniers événements conservés")
+        room.latency_s = time.perf_counter() - t0
+
+    def cycle(self) -> None:
+        args = self.args
+        self.reload_salles()
+        salles, targets = list(self.salles), dict(self.targets)
+        start_date, end_date = window_for(args)
+        metrics = Metrics(salles) if args.metrics_out else None
+        t_start = time.time()
+        t0 = time.monotonic()
+        step = args.interval * args.stagger / len(salles) if salles else 0.0
+        for i, salle in enumerate(salles):
+            if self.stop.wait(max(0.0, t0 + i * step - time.monotonic())):
+                return
+            self.refresh_room(salle, start_date, end_date, metrics)
+        # une salle restée en échec après un changement de jour garde ses jours encore dans la fenêtre
+        room_days = {s: self.rooms[s].days for s in salles}
+        written = write_targets(args.out, targets, room_days, start_date, args.days, args.include_empty_days, args.eol)
+        changed = any(r.changed for r in written.values())
+        if args.occupancy_out:
+            write_occupancy_targets(args.occupancy_out, targets, room_days, start_date, args.days,
+                                    args.preheat, args.postheat, args.eol)
+        failed = [s for s in salles if self.rooms[s].last_error]
+        with self._lock:
+            self.cycles += 1
+            self.last_cycle = {"started": t_start, "duration_s": time.monotonic() - t0,
+                               "rooms": len(salles), "failed": failed, "changed": changed}
+        self.log(f"cycle {self.cycles} : {len(salles) - len(failed)}/{len(salles)} salle(s) à jour, "
+                 f"{'XML réécrit' if changed else 'XML inchangé'} ({time.monotonic() - t0:.1f} s)")
+        if metrics is not None:
+            write_if_changed(Path(args.metrics_out),
+                             json.dumps(metrics.as_dict(), ensure_ascii=False, indent=1).encode("utf-8"))
+        if args.status_file:
+            write_if_changed(Path(args.status_file),
+                             json.dumps(self.status(), ensure_ascii=False, indent=1).encode("utf-8"))
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "pid": os.getpid(), "started": self.started, "now": time.time(),
+                "interval_s": self.args.interval, "cycles": self.cycles, "salles_reloads": self.reloads,
+                "last_cycle": dict(self.last_cycle),
+                "rooms": {s: {"ok": r.last_error is None and r.last_ok is not None, "last_ok": r.last_ok,
+                              "last_error": r.last_error, "failures": r.failures,
+                              "latency_s": round(r.latency_s, 4),
+                              "events": sum(len(lst) for lst in r.days.values())}
+                          for s, r in self.rooms.items()},
+                "http": self.client.summary(),
+            }
+
+    def serve_status(self, port: int) -> Any:
+        """Petit serveur HTTP local (thread) : GET /status -> JSON de status()."""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        daemon = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") not in ("", "/status"):
+                    self.send_error(404)
+                    return
+                body = json.dumps(daemon.status(), ensure_ascii=False).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *a):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        threading.Thread(target=server.serve_forever, name="status-http", daemon=True).start()
+        self.log(f"statut sur http://127.0.0.1:{server.server_address[1]}/status")
+        return server
+
+    def run(self) -> int:
+        args = self.args
+        server = self.serve_status(args.status_port) if args.status_port is not None else None
+        try:
+            import signal
+            signal.signal(signal.SIGTERM, lambda *_: self.stop.set())
+        except (ValueError, AttributeError):
+            pass  # hors thread principal
+        try:
+            while not self.stop.is_set():
+                t0 = time.monotonic()
+                self.cycle()
+                if args.cycles and self.cycles >= args.cycles:
+                    break
+                self.stop.wait(max(0.0, args.interval - (time.monotonic() - t0)))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if server is not None:
+                server.shutdown()
+            self.client.close()
+        self.log("arrêt")
+        return 0
+
+def parse_start_date(value: str) -> date:
+    try:
+        if len(value) != 8 or not value.isdigit():
+            raise ValueError(value)
+        return datetime.strptime(value, "%Y%m%d").date()
+    except ValueError:
+        import argparse
+        raise argparse.ArgumentTypeError(f"date invalide (YYYYMMDD attendu): {value}")
+
+def main(argv: Optional[List[str]] = None, hooks: Optional[RunHooks] = None) -> int:
+    import argparse
+    p = argparse.ArgumentParser(description="Génère un XML d'horaires (7 jours par défaut) à partir d'une API Henallux ou de mocks.")
+    p.add_argument("--salles", help="Fichier .ini listant les salles (chemin relatif OK; facultatif avec --snapshot-in).")
+    p.add_argument("--out", required=True, help="Fichier XML de sortie (chemin relatif OK); avec un .ini en sections, {target} = nom de la section.")
     p.add_argument("--api", default="https://simple-planning.henallux.be/api/getHoraireSalle", help="URL de l'API.")
     p.add_argument("--mock", help="Fichier mock JSON unique (optionnel).")
     p.add_argument("--mock-dir", help="Dossier de mocks (un fichier par salle, optionnel).")
+    p.add_argument("--start", type=parse_start_date, help="Premier jour YYYYMMDD (défaut: aujourd'hui).")
+    p.add_argument("--days", type=int, default=7, help="Nombre de jours à générer (défaut: 7).")
+    p.add_argument("--bulk", action="store_true",
+                   help="Flux partagé (--mock ou --bulk-code) récupéré et traité une seule fois, puis réparti par salle.")
+    p.add_argument("--bulk-code", help="--bulk : codeSalle envoyé à l'API pour obtenir le flux de tout le site.")
     p.add_argument("--include-empty-days", action="store_true", help="Inclure les jours vides.")
     p.add_argument("--no-filter-location", action="store_true", help="Ne pas filtrer par salle exacte (affiche tout).")
     p.add_argument("--shift-hours", type=int, default=-2, help="Décalage d'heures à appliquer (défaut: -2).")
+    p.add_argument("--merge-gap", type=int, default=0,
+                   help="Fusionne aussi les créneaux d'un même cours séparés d'au plus N minutes (défaut: 0).")
     p.add_argument("--eol", choices=["lf", "crlf"], default="lf", help="Style de fin de ligne de sortie (défaut: lf).")
+    p.add_argument("--workers", type=int, default=1, help="Nombre de salles récupérées en parallèle (défaut: 1 = séquentiel).")
+    p.add_argument("--processes", type=int, default=1,
+                   help="Processus de calcul (décodage, normalisation, fusion) en parallèle (défaut: 1).")
+    p.add_argument("--max-per-host", type=int, default=4, help="Requêtes simultanées max vers un même hôte (défaut: 4).")
+    p.add_argument("--timeout", type=float, default=30, help="Délai max par requête HTTP en secondes (défaut: 30).")
+    p.add_argument("--retries", type=int, default=3, help="Nouvelles tentatives sur erreur réseau/5xx transitoire (défaut: 3).")
+    p.add_argument("--cache-dir", help="Dossier de cache des réponses API (désactivé par défaut).")
+    p.add_argument("--cache-ttl", type=float, default=3600, help="Durée de validité du cache en secondes (défaut: 3600).")
+    p.add_argument("--offline", action="store_true", help="N'utiliser que le cache (aucun appel réseau).")
+    p.add_argument("--incremental", action="store_true",
+                   help=f"Ne retraiter que les salles dont le flux a changé; code de sortie {EXIT_UNCHANGED} si le XML est inchangé.")
+    p.add_argument("--state-file", help="Fichier d'état de --incremental (défaut: <out>.state.json).")
+    p.add_argument("--daemon", action="store_true", help="Reste résident et rafraîchit les salles toutes les --interval secondes.")
+    p.add_argument("--interval", type=float, default=900, help="--daemon : période de rafraîchissement en secondes (défaut: 900).")
+    p.add_argument("--stagger", type=float, default=0.5,
+                   help="--daemon : fraction de la période sur laquelle les requêtes sont étalées (défaut: 0.5).")
+    p.add_argument("--deadline", type=float, help="Échéance globale en secondes : les salles non obtenues à temps passent en repli.")
+    p.add_argument("--room-timeout", type=float, help="Durée max par salle en secondes, tentatives comprises (défaut: aucune).")
+    p.add_argument("--status-file", help="Fichier JSON d'état par salle (à jour / périmée / absente; --daemon : à chaque cycle).")
+    p.add_argument("--status-port", type=int, help="--daemon : sert l'état sur http://127.0.0.1:PORT/status.")
+    p.add_argument("--cycles", type=int, default=0, help="--daemon : s'arrête après N cycles (défaut: 0 = jamais).")
+    p.add_argument("--occupancy-out", help="Écrit aussi l'occupation par salle (créneaux de 10 min, plages occupées); {target} = un fichier par section.")
+    p.add_argument("--preheat", type=int, default=0, help="--occupancy-out : minutes de préchauffe avant chaque occupation (défaut: 0).")
+    p.add_argument("--postheat", type=int, default=0, help="--occupancy-out : minutes maintenues après chaque occupation (défaut: 0).")
+    p.add_argument("--snapshot-out", help="Écrit aussi les créneaux normalisés dans un instantané binaire.")
+    p.add_argument("--snapshot-in", help="Génère le XML depuis un instantané (ni réseau, ni décodage du flux).")
+    p.add_argument("--profile", action="store_true", help="Affiche le temps, les volumes et la mémoire par étape et par salle.")
+    p.add_argument("--metrics-out", help="Écrit ces mesures dans un fichier JSON (pour la supervision).")
     p.add_argument("--verbose", action="store_true", help="Logs détaillés.")
-    args = p.parse_args()
+    args = p.parse_args(argv)
+    deadline = time.monotonic() + args.deadline if args.deadline else None
+    if not args.salles and not args.snapshot_in:
+        p.error("--salles est requis (sauf avec --snapshot-in)")
+    if args.snapshot_in and (args.daemon or args.bulk or args.incremental or args.snapshot_out):
+        p.error("--snapshot-in ne se combine pas avec --daemon, --bulk, --incremental ni --snapshot-out")
+    if args.offline and not args.cache_dir:
+        p.error("--offline nécessite --cache-dir")
+    if args.days < 1:
+        p.error("--days doit être >= 1")
+    if args.merge_gap < 0:
+        p.error("--merge-gap doit être positif ou nul")
+    if args.bulk and not (args.mock or args.bulk_code):
+        p.error("--bulk nécessite --mock ou --bulk-code")
+    if args.processes < 1:
+        p.error("--processes doit être >= 1")
+    if args.preheat < 0 or args.postheat < 0:
+        p.error("--preheat et --postheat doivent être positifs ou nuls")
+    if (args.deadline is not None and args.deadline <= 0) or (args.room_timeout is not None and args.room_timeout <= 0):
+        p.error("--deadline et --room-timeout doivent être > 0")
+    if args.daemon:
+        if args.bulk:
+            p.error("--bulk ne s'applique pas à --daemon")
+        if args.snapshot_out:
+            p.error("--snapshot-out ne s'applique pas à --daemon (instantané d'une exécution ponctuelle)")
+        if args.incremental or args.profile or args.deadline:
+            p.error("--daemon garde son état en mémoire : --incremental, --profile et --deadline ne s'appliquent pas")
+        if args.workers > 1 or args.processes > 1:
+            p.error("--daemon traite une salle à la fois, étalées sur --stagger : --workers et --processes ne s'appliquent pas")
+        if args.interval <= 0 or not 0 <= args.stagger <= 1:
+            p.error("--daemon : --interval doit être > 0 et --stagger entre 0 et 1")
+        try:
+            err = check_targets(load_targets_ini(args.salles), args.out, args.occupancy_out)
+        except (OSError, ValueError) as e:
+            err = str(e)
+        if err:
+            p.error(err)
+        client = HttpClient(timeout=args.timeout, retries=args.retries, pool_size=args.max_per_host)
+        cache = ResponseCache(args.cache_dir, ttl=args.cache_ttl) if args.cache_dir else None
+        return Daemon(args, client, cache).run()
 
-    salles = load_salles_ini(args.salles)
+    snapshot: Optional[Snapshot] = None
+    if args.snapshot_in:
+        try:
+            snapshot = Snapshot(args.snapshot_in)
+        except (OSError, ValueError) as e:
+            raise SystemExit(f"--snapshot-in : {e}")
+    try:
+        targets = load_targets_ini(args.salles) if args.salles else {"": list(snapshot.rooms)}
+    except ValueError as e:
+        raise SystemExit(str(e))
+    salles = load_salles_ini(args.salles) if args.salles else targets[""]
     if not salles:
         raise SystemExit("Aucune salle trouvée dans --salles")
+    err = check_targets(targets, args.out, args.occupancy_out)
+    if err:
+        p.error(err)
+    if snapshot is not None and snapshot.filter_location == args.no_filter_location:
+        p.error("--snapshot-in : instantané écrit " + ("avec" if snapshot.filter_location else "sans")
+                + " filtrage par salle, relancer " + ("sans" if snapshot.filter_location else "avec")
+                + " --no-filter-location ou régénérer l'instantané")
 
-    today = datetime.now(TZ).date() if TZ else datetime.now().date()
-    start_date = today
-    end_date = start_date + timedelta(days=6)
+    start_date, end_date = window_for(args)
 
-    events_by_date: Dict[str, List[Dict[str, str]]] = defaultdict(list)
+    # événements normalisés par salle, partagés par toutes les cibles qui la citent
+    room_days: Dict[str, Dict[int, List[Event]]] = {}
+    salle_filter_on = not args.no_filter_location
+    state: Optional[IncrementalState] = None
+    if args.incremental:
+        params = {"start": start_date.isoformat(), "end": end_date.isoformat(),
+                  "shift_hours": args.shift_hours, "filter_location": salle_filter_on,
+                  "merge_gap": args.merge_gap}
+        state = IncrementalState(args.state_file or args.out.replace("{target}", "cibles") + ".state.json", params)
 
-    for salle in salles:
-        data = fetch_for_salle(args.api, salle, args.mock, args.mock_dir, verbose=args.verbose)
-        feed = normalize_feed(data)
-        evts = events_from_feed(feed, None if args.no_filter_location else salle, start_date, end_date, args.shift_hours)
-        # Grouper par date
-        by_date: Dict[str, List[Dict[str, str]]] = defaultdict(list)
-        for e in evts:
-            by_date[e["DATEKEY"]].append({k: e[k] for k in ("LOCATION","TimeSTART","TimeEND","SUMMARY")})
-        # Fusion par date
-        for dkey, lst in by_date.items():
-            events_by_date[dkey].extend(merge_contiguous_events(lst))
-
-    if args.include_empty_days:
-        for i in range(7):
-            dkey = (start_date + timedelta(days=i)).strftime("%Y%m%d")
-            events_by_date.setdefault(dkey, [])
-
-    xml_text_lf = build_xml(events_by_date)  # construit avec \n
-    if args.eol == "crlf":
-        out_bytes = xml_text_lf.replace("\n", "\r\n").encode("utf-8")
-    else:
-        out_bytes = xml_text_lf.encode("utf-8")
+    metrics = Metrics(salles) if (args.profile or args.metrics_out or hooks is not None) else None
+    if hooks is not None:
+        hooks.metrics = metrics
+    cancel = hooks.cancel if hooks is not None else None
+    client = HttpClient(timeout=args.timeout, retries=args.retries, pool_size=args.max_per_host)
+    cache = ResponseCache(args.cache_dir, ttl=args.cache_ttl) if args.cache_dir else None
+    snap_out = SnapshotWriter(salle_filter_on) if args.snapshot_out else None
+    fallback = RoomFallback(args.api, cache, state, salle_filter_on,
+                            (start_date, end_date, args.shift_hours, args.merge_gap), metrics)
+    try:
+        if snapshot is not None:
+            t0 = time.perf_counter()
+            for salle in salles:
+                room_days[salle] = snapshot.room_days(salle, start_date, end_date, args.shift_hours, args.merge_gap)
+                if salle in snapshot.rooms:
+                    fallback.ok(salle)
+                else:
+                    fallback.missing(salle, f"pas dans l'instantané {args.snapshot_in}")
+                if hooks is not None:
+                    hooks.check()
+                    hooks.room_done(salle, len(room_days), len(salles))
+            if metrics is not None:
+                metrics.add("snapshot_in", time.perf_counter() - t0, items_in=snapshot.n_events)
+            if args.verbose:
+                print(f"[snapshot] {snapshot.n_events} créneaux, {len(snapshot.rooms)} salle(s) <- {args.snapshot_in}")
+        else:
+            pool: "Optional[ProcessPoolExecutor]" = None
+            if args.processes > 1:
+                from concurrent.futures import ProcessPoolExecutor
+                pool = ProcessPoolExecutor(max_workers=args.processes)
+            bulk: Optional[BulkFeed] = None
+            fetched: Iterable[Tuple[str, Any]]
+            if args.bulk:
+                try:
+                    shared: Any = fetch_for_salle(args.api, args.bulk_code or "", args.mock, None,
+                                                  verbose=args.verbose, client=client, cache=cache,
+                                                  offline=args.offline, metrics=metrics, cancel=cancel,
+                                                  deadline=deadline, room_timeout=args.room_timeout)
+                except GenerationCancelled:
+                    raise
+                except Exception as e:
+                    shared = fallback.shared_feed(args.bulk_code or "", e)
+                    if shared is None:
+                        shared = e
+                if not isinstance(shared, BaseException):
+                    bulk = BulkFeed(shared, salle_filter_on, start_date, end_date, args.shift_hours, args.merge_gap,
+                                    metrics, pool=pool, parts=args.processes)
+                    if snap_out is not None:
+                        snap_out.share(shared)
+                fetched = ((salle, shared) for salle in salles)
+            else:
+                # une salle en échec ou hors délai produit son exception, traitée par le repli
+                fetched = iter_fetch_salles(args.api, salles, args.mock, args.mock_dir,
+                                            workers=args.workers, per_host=args.max_per_host, isolate=True,
+                                            verbose=args.verbose, client=client,
+                                            cache=cache, offline=args.offline, metrics=metrics,
+                                            cancel=cancel, deadline=deadline, room_timeout=args.room_timeout)
+            # (salle, empreinte, événements par jour, Future d'un processus ou exception, origine) dans l'ordre
+            # de salles, origine = "reused" (--incremental), "rebuilt" ou "fallback";
+            # au plus 2 x --processes en attente, pour ne pas garder en mémoire toutes les réponses brutes
+            rooms: "deque[Tuple[str, str, Any, str]]" = deque()
+            fingerprint = ""
+
+            def finish(salle: str, fingerprint: str, days: Any, kind: str) -> None:
+                # le repli n'est enregistré qu'ici : rapport et lignes [repli] dans l'ordre de salles
+                if isinstance(days, BaseException):
+                    days = fallback.recover(salle, days)
+                elif not isinstance(days, dict):  # Future d'un processus (--processes)
+                    try:
+                        days = collect_job(days, metrics, salle)
+                    except Exception as e:
+                        days, kind = fallback.recover(salle, e), "fallback"
+                if kind != "fallback":
+                    if kind == "rebuilt" and state is not None:
+                        state.update(salle, fingerprint, days)
+                    if metrics is not None:
+                        metrics.set_status(salle, "réutilisée" if kind == "reused" else "recalculée")
+                    fallback.ok(salle)
+                room_days[salle] = days
+                if hooks is not None:
+                    hooks.room_done(salle, len(room_days), len(salles))
+
+            try:
+                for salle, data in fetched:
+                    if hooks is not None:
+                        hooks.check()
+                    if isinstance(data, BaseException):
+                        rooms.append((salle, "", data, "fallback"))
+                        continue
+                    if snap_out is not None:
+                        snap_out.add_room(salle, data)
+                    days: Any = None
+                    if state is not None:
+                        if bulk is None or not fingerprint:
+                            fingerprint = feed_fingerprint(data)
+                        days = state.lookup(salle, fingerprint)
+                    kind = "rebuilt" if days is None else "reused"
+                    try:
+                        if days is not None:
+                            pass
+                        elif bulk is not None:
+                            days = bulk.room(salle)
+                        elif pool is not None:
+                            days = pool.submit(room_events_job, data, salle if salle_filter_on else None,
+                                               start_date, end_date, args.shift_hours, args.merge_gap,
+                                               metrics is not None)
+                        else:
+                            days = room_events_by_date(data, salle if salle_filter_on else None, start_date, end_date,
+                                                       args.shift_hours, args.merge_gap, metrics=metrics, salle=salle)
+                    except Exception as e:  # flux reçu mais inexploitable : même repli qu'un échec de récupération
+                        days, kind = e, "fallback"
+                    rooms.append((salle, fingerprint, days, kind))
+                    while len(rooms) > 2 * args.processes:
+                        finish(*rooms.popleft())
+                while rooms:
+                    finish(*rooms.popleft())
+            finally:
+                if pool is not None:
+                    pool.shutdown()
+    finally:
+        client.close()
+        if snapshot is not None:
+            snapshot.close()
+    if args.verbose and client.timings:
+        st = client.summary()
+        if st["requests"] > len(client.timings):
+            print(f"[http] {len(client.timings)} dernières requêtes :")
+        for t in client.timings:
+            how = "réutilisée" if t.reused else f"neuve, connexion {t.connect_s * 1000:.0f} ms"
+            print(f"[http] {t.status} {t.total_s * 1000:.0f} ms ({how}, {t.attempts} tentative(s), {t.nbytes} o)")
+        print(f"[http] {st['requests']} requêtes, {st['new_connections']} connexions ouvertes, "
+              f"{st['reused_connections']} réutilisées, établissement total {st['connect_s'] * 1000:.0f} ms")
+    if args.verbose and cache is not None:
+        print(f"[cache] {cache.hits} hit(s) dont {cache.revalidated} revalidé(s), "
+              f"{cache.misses} miss, {cache.bytes_saved} octets économisés")
+
+    for line in fallback.lines():
+        print(line, file=sys.stderr)
+    # une cible dont aucune salle n'est disponible garde son XML précédent plutôt que d'être vidée
+    kept = [name for name, rs in targets.items()
+            if rs and all(fallback.rooms[s].status == "missing" for s in rs) and target_path(args.out, name).exists()]
+    for name in kept:
+        print(f"[repli] {target_path(args.out, name)} : aucune salle disponible, XML précédent conservé",
+              file=sys.stderr)
+
+    if hooks is not None:
+        hooks.check()
+    # Ecriture binaire en flux pour maîtriser les fins de lignes; fichier inchangé = pas de réécriture
+    written = write_targets(args.out, {name: rs for name, rs in targets.items() if name not in kept}, room_days,
+                            start_date, args.days, args.include_empty_days, args.eol, metrics)
+    changed = any(r.changed for r in written.values())
+    if args.occupancy_out:
+        occupancy = write_occupancy_targets(args.occupancy_out,
+                                            {name: rs for name, rs in targets.items() if name not in kept},
+                                            room_days, start_date, args.days, args.preheat, args.postheat,
+                                            args.eol, metrics)
+        if args.verbose:
+            for r in occupancy.values():
+                print(f"[occupation] {r.n_events} plage(s) -> {r.path}")
+    if state is not None:
+        state.save(salles)
+    if snap_out is not None:
+        t0 = time.perf_counter()
+        write_stream_if_changed(Path(args.snapshot_out), snap_out.write)
+        if metrics is not None:
+            metrics.add("snapshot_out", time.perf_counter() - t0,
+                        nbytes=Path(args.snapshot_out).stat().st_size)
+        if args.verbose:
+            print(f"[snapshot] -> {args.snapshot_out}")
 
-    # Ecriture binaire pour maîtriser les fins de lignes
-    out_path = Path(args.out)
-    out_path.parent.mkdir(parents=True, exist_ok=True)
-    out_path.write_bytes(out_bytes)
+    if metrics is not None:
+        memo = ical_local_minutes.cache_info()
+        metrics.extra["http"] = client.summary()
+        metrics.extra["ical_memo"] = {"hits": memo.hits, "misses": memo.misses, "size": memo.currsize}
+        metrics.extra["clean_text_memo"] = clean_text_stats()
+        metrics.extra["rooms_status"] = fallback.counts()
+        if cache is not None:
+            metrics.extra["cache"] = {"hits": cache.hits, "misses": cache.misses,
+                                      "revalidated": cache.revalidated, "bytes_saved": cache.bytes_saved}
+        if args.profile:
+            print(metrics.report())
+        if args.metrics_out:
+            write_if_changed(Path(args.metrics_out),
+                             json.dumps(metrics.as_dict(), ensure_ascii=False, indent=1).encode("utf-8"))
 
     if args.verbose:
-        print(f"OK -> {out_path} ({args.eol.upper()})")
+        ct = clean_text_stats()
+        print(f"[clean_text] {ct['hits']} hit(s), {ct['misses']} miss ({ct['hit_rate']:.1%}), "
+              f"{ct['size']} texte(s) en mémo")
+        if state is not None:
+            print(f"[incremental] {state.reused} salle(s) réutilisée(s), {state.rebuilt} recalculée(s)")
+        for name, r in written.items():
+            label = f" [{name}]" if name else ""
+            print(f"OK{label} -> {r.path} ({args.eol.upper()})" if r.changed else f"Inchangé{label} -> {r.path}")
+        counts = fallback.counts()
+        print(f"[salles] {counts['fresh']} à jour, {counts['stale']} périmée(s), {counts['missing']} absente(s)")
+    if args.status_file:
+        status = {"finished": time.time(), "deadline_s": args.deadline, "room_timeout_s": args.room_timeout,
+                  "kept": [str(target_path(args.out, name)) for name in kept], **fallback.as_dict()}
+        write_if_changed(Path(args.status_file), json.dumps(status, ensure_ascii=False, indent=1).encode("utf-8"))
+    if fallback.degraded():
+        return EXIT_DEGRADED
+    if args.incremental and not changed:
+        return EXIT_UNCHANGED
+    return 0
 
 if __name__ == "__main__":
-    main()
+    raise SystemExit(main())
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""Outils communs aux tests : main() en processus et faux serveur de l'API Henallux (http.server)."""
+import contextlib
+import io
+import sys
+import threading
+import time
+import urllib.parse
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+import generateur_horaire_v2 as gh  # noqa: E402
+
+def run_main(*argv):
+    """main() en processus, sorties capturées : (code de sortie, stdout, stderr).
+    Un SystemExit (argparse, message d'erreur) donne son code."""
+    out, err = io.StringIO(), io.StringIO()
+    with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+        try:
+            code = gh.main([str(a) for a in argv])
+        except SystemExit as e:
+            code = e.code
+    return code, out.getvalue(), err.getvalue()
+
+class StubApi:
+    """Faux getHoraireSalle sur 127.0.0.1 (port libre) : POST codeSalle=<salle> -> <mock_dir>/<salle>.json.
+
+    - `delay` : attente avant chaque réponse (secondes);
+    - `modes[salle]` : un statut HTTP à renvoyer, ou "hang" (aucune réponse avant la sortie du bloc with);
+    - `redirects[chemin]` : (statut, Location) renvoyé pour ce chemin;
+    - ETag par contenu, If-None-Match identique -> 304.
+    Compte les requêtes par salle, les 304 et le nombre maximal de requêtes simultanées, et garde
+    les lignes de requête et en-têtes Proxy-Authorization reçus (le serveur sert aussi de proxy HTTP :
+    URL absolue, et CONNECT refusé par 502)."""
+    def __init__(self, mock_dir: Path, delay: float = 0.0):
+        self.mock_dir = Path(mock_dir)
+        self.delay = delay
+        self.modes = {}
+        self.redirects = {}
+        self.requests = []
+        self.lines = []
+        self.proxy_auth = []
+        self.not_modified = 0
+        self.inflight = 0
+        self.max_inflight = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}/api/getHoraireSalle"
+
+    def reset(self) -> None:
+        with self._lock:
+            self.requests, self.lines, self.proxy_auth = [], [], []
+            self.not_modified, self.max_inflight = 0, 0
+
+    def __enter__(self) -> "StubApi":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _record(self):
+                with stub._lock:
+                    stub.lines.append(self.requestline)
+                    if "Proxy-Authorization" in self.headers:
+                        stub.proxy_auth.append(self.headers["Proxy-Authorization"])
+
+            def do_CONNECT(self):
+                self._record()
+                self.close_connection = True
+                self._send(502, b"")
+
+            def do_POST(self):
+                self._record()
+                n = int(self.headers.get("Content-Length", 0))
+                form = urllib.parse.parse_qs(self.rfile.read(n).decode("utf-8"))
+                salle = form.get("codeSalle", [""])[0]
+                redirect = stub.redirects.get(urllib.parse.urlsplit(self.path).path)
+                if redirect is not None:
+                    return self._send(redirect[0], b"", {"Location": redirect[1]})
+                with stub._lock:
+                    stub.requests.append(salle)
+                    stub.inflight += 1
+                    stub.max_inflight = max(stub.max_inflight, stub.inflight)
+                try:
+                    self._answer(salle)
+                finally:
+                    with stub._lock:
+                        stub.inflight -= 1
+
+            def _answer(self, salle):
+                if stub.delay:
+                    time.sleep(stub.delay)
+                mode = stub.modes.get(salle)
+                if mode == "hang":
+                    stub._stop.wait(30)
+                    return
+                if isinstance(mode, int):
+                    return self._send(mode, b"erreur")
+                try:
+                    body = (stub.mock_dir / f"{salle}.json").read_bytes()
+                except OSError:
+                    return self._send(404, b"salle inconnue")
+                etag = '"%08x"' % zlib.crc32(body)
+                if self.headers.get("If-None-Match") == etag:
+                    with stub._lock:
+                        stub.not_modified += 1
+                    return self._send(304, b"", {"ETag": etag})
+                self._send(200, body, {"ETag": etag, "Content-Type": "application/json; charset=utf-8"})
+
+            def _send(self, status, body, headers=None):
+                self.send_response(status)
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""--bulk avec --processes : tranches du flux décodées séparément, XML identique au traitement
+salle par salle, et repli en un processus quand une coupure tombe dans un objet imbriqué."""
+import json
+import random
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+
+from support import gh, run_main
+import benchmark_horaire as bench
+
+START = bench.DEFAULT_START
+END = START + timedelta(days=13)
+WINDOW = ["--start", START.strftime("%Y%m%d"), "--days", "14"]
+
+def site_feed(rooms=3):
+    feed = []
+    rng = random.Random(7)
+    for room in bench.room_names(rooms):
+        feed.extend(bench.synthetic_feed(room, START, 14, 20, rng))
+    feed.sort(key=lambda it: it["dtstart"])
+    return feed
+
+def bulk_days(data, pool=None, parts=1):
+    return gh.BulkFeed(data, False, START, END, -2, 0, pool=pool, parts=parts).room("")
+
+class SplitFeedTest(unittest.TestCase):
+    def test_slices_cover_the_feed(self):
+        feed = site_feed()
+        ical = json.dumps({"feed": feed}, ensure_ascii=False, indent=1)
+        decoder = json.JSONDecoder()
+        for parts in (2, 3, 7):
+            with self.subTest(parts=parts):
+                slices = gh.split_feed({"horaire": {"ICAL": ical}}, parts)
+                self.assertEqual(len(slices), parts)
+                items = [it for part in slices for it in gh._iter_feed_slice(part, decoder)]
+                self.assertEqual(items, feed)
+
+    def test_separators_inside_strings_are_skipped(self):
+        feed = site_feed(1)
+        for it in feed:
+            it["summary;language=fr"] = 'a"}, {"b \\\\'
+        ical = json.dumps({"feed": feed})
+        slices = gh.split_feed({"horaire": {"ICAL": ical}}, 5)
+        decoder = json.JSONDecoder()
+        self.assertEqual([it for part in slices for it in gh._iter_feed_slice(part, decoder)], feed)
+
+    def test_other_shapes_are_not_split(self):
+        self.assertIsNone(gh.split_feed({"horaire": {"ICAL": '{"meta": 1, "feed": []}'}}, 4))
+        self.assertIsNone(gh.split_feed({"horaire": {"ICAL": '{"feed": [], "meta": 1}'}}, 4))
+        self.assertEqual(gh.split_feed({"feed": [1, 2, 3]}, 2), [[1, 2], [3]])
+
+    def test_cut_inside_nested_object_is_detected(self):
+        decoder = json.JSONDecoder()
+        for part in ('{"a": [{"n": 1}', '{"n": 2}], "b": 1}, {"c": 3}'):
+            with self.assertRaises(ValueError):
+                list(gh._iter_feed_slice(part, decoder))
+
+class BulkProcessesTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.pool = ProcessPoolExecutor(2)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.shutdown()
+
+    def test_same_events_as_single_process(self):
+        feed = site_feed()
+        for data in ({"horaire": {"ICAL": json.dumps({"feed": feed})}}, {"feed": feed}):
+            serial = bulk_days(data)
+            for parts in (2, 5):
+                with self.subTest(parts=parts, ical="horaire" in data):
+                    self.assertEqual(bulk_days(data, self.pool, parts), serial)
+
+    def test_nested_objects_fall_back_to_one_process(self):
+        feed = site_feed()
+        for it in feed:
+            it["attendees"] = [{"n": 1}, {"n": 2}]
+        data = {"horaire": {"ICAL": json.dumps({"feed": feed})}}
+        self.assertEqual(bulk_days(data, self.pool, 4), bulk_days(data))
+
+    def test_cli_output_matches_per_room(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            bench.write_mock_dir(tmp, bench.room_names(6), START, 14, 12, 4, bulk=True)
+            per_room = tmp / "per_room.xml"
+            code, _, err = run_main("--salles", tmp / "salles.ini", "--mock-dir", tmp, "--out", per_room, *WINDOW)
+            self.assertEqual(code, 0, err)
+            for n in (1, 3):
+                out = tmp / f"bulk{n}.xml"
+                code, _, err = run_main("--salles", tmp / "salles.ini", "--mock", tmp / bench.BULK_MOCK, "--bulk",
+                                        "--processes", n, "--out", out, *WINDOW)
+                self.assertEqual(code, 0, err)
+                self.assertEqual(out.read_bytes(), per_room.read_bytes())
+
+if __name__ == "__main__":
+    unittest.main()
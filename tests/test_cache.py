@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""Cache disque des réponses : hit sans appel réseau, revalidation 304, --offline."""
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from support import StubApi, run_main
+import benchmark_horaire as bench
+
+ROOMS = bench.room_names(5)
+
+class CacheTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp = Path(self._tmp.name)
+        self.mocks = self.tmp / "mocks"
+        bench.write_mock_dir(self.mocks, ROOMS, bench.DEFAULT_START, 7, 8, 3)
+        self.stub = StubApi(self.mocks).__enter__()
+        self.cache = self.tmp / "cache"
+
+    def tearDown(self):
+        self.stub.__exit__(None, None, None)
+        self._tmp.cleanup()
+
+    def generate(self, name, *extra):
+        out = self.tmp / name
+        self.stub.reset()
+        code, stdout, err = run_main("--salles", self.mocks / "salles.ini", "--api", self.stub.url,
+                                     "--out", out, "--cache-dir", self.cache, "--verbose",
+                                     "--start", bench.DEFAULT_START.strftime("%Y%m%d"), "--days", "7", *extra)
+        self.assertEqual(code, 0, err)
+        return out.read_bytes(), stdout
+
+    def test_fresh_entries_skip_the_network(self):
+        first, _ = self.generate("a.xml")
+        self.assertEqual(sorted(self.stub.requests), sorted(ROOMS))
+        second, stdout = self.generate("b.xml")
+        self.assertEqual(self.stub.requests, [])
+        self.assertEqual(second, first)
+        self.assertIn(f"[cache] {len(ROOMS)} hit(s) dont 0 revalidé(s), 0 miss", stdout)
+
+    def test_stale_entries_are_revalidated_with_304(self):
+        first, _ = self.generate("a.xml", "--cache-ttl", "0")
+        self.assertEqual(self.stub.not_modified, 0)
+        second, stdout = self.generate("b.xml", "--cache-ttl", "0")
+        self.assertEqual(sorted(self.stub.requests), sorted(ROOMS))
+        self.assertEqual(self.stub.not_modified, len(ROOMS))
+        self.assertEqual(second, first)
+        self.assertIn(f"[cache] {len(ROOMS)} hit(s) dont {len(ROOMS)} revalidé(s)", stdout)
+
+    def test_changed_feed_replaces_the_entry(self):
+        self.generate("a.xml", "--cache-ttl", "0")
+        other = self.tmp / "other"
+        bench.write_mock_dir(other, ROOMS[:1], bench.DEFAULT_START, 7, 8, 99)
+        (self.mocks / f"{ROOMS[0]}.json").write_bytes((other / f"{ROOMS[0]}.json").read_bytes())
+        changed, _ = self.generate("b.xml", "--cache-ttl", "0")
+        self.assertEqual(self.stub.not_modified, len(ROOMS) - 1)
+        self.assertNotEqual(changed, (self.tmp / "a.xml").read_bytes())
+        again, _ = self.generate("c.xml", "--cache-ttl", "0")
+        self.assertEqual(self.stub.not_modified, len(ROOMS))
+        self.assertEqual(again, changed)
+
+    def test_fetched_bytes_are_the_response_sizes(self):
+        sizes = sum((self.mocks / f"{room}.json").stat().st_size for room in ROOMS)
+        for name, ttl in (("live", "0"), ("revalidated", "0"), ("hit", "3600")):
+            with self.subTest(name):
+                metrics = self.tmp / f"{name}.json"
+                self.generate(f"{name}.xml", "--cache-ttl", ttl, "--metrics-out", metrics)
+                stages = json.loads(metrics.read_text(encoding="utf-8"))["stages"]
+                self.assertEqual(stages["fetch"]["nbytes"], sizes)
+
+    def test_offline_reads_only_the_cache(self):
+        first, _ = self.generate("a.xml", "--cache-ttl", "0")
+        offline, _ = self.generate("b.xml", "--offline")
+        self.assertEqual(self.stub.requests, [])
+        self.assertEqual(offline, first)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""clean_text (motifs précompilés, chemin rapide, mémo) : même résultat que la chaîne de re.sub d'origine."""
+import random
+import re
+import unittest
+
+from support import gh
+
+def reference_clean_text(x):
+    """clean_text d'origine."""
+    if x is None:
+        return ""
+    x = x.replace(" ", " ")
+    x = re.sub(r"[\r\n]+", " ", x)
+    x = re.sub(r"\s{2,}", " ", x)
+    return x.strip()
+
+CASES = [
+    None, "", " ", " ", "\r\n", "\n\n\n", "\t",
+    "English - DARTEVELLE Jennifer", "IV-E309-Salle de dessin",
+    "Mise à niveau", "a  b", "  bord  ",
+    "fine espace", "fine  double", "étroite insécable", " bord ",
+    "ligne 1\r\nligne 2", "ligne\n\n2", "fin\n", "\rdébut", "a \r\n b", "a\tb", "a\t\tb",
+    "a \nb", "x   y",
+]
+
+class CleanTextTest(unittest.TestCase):
+    def setUp(self):
+        gh._clean_text_memo.cache_clear()
+
+    def test_same_as_reference(self):
+        for x in CASES:
+            with self.subTest(x=x):
+                self.assertEqual(gh.clean_text(x), reference_clean_text(x))
+                self.assertEqual(gh.clean_text(x), reference_clean_text(x))  # depuis le mémo
+
+    def test_random_whitespace(self):
+        rng = random.Random(16)
+        alphabet = ["a", "é", "-", " ", "\t", "\r", "\n", " ", " ", " ", "　", "\x0b"]
+        for _ in range(5000):
+            x = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 12)))
+            self.assertEqual(gh.clean_text(x), reference_clean_text(x), repr(x))
+
+    def test_result_is_interned(self):
+        a = gh.clean_text("".join(["Salle", " ", "B"]))
+        b = gh.clean_text("".join(["Salle", " ", "B"]))
+        self.assertIs(a, b)
+
+if __name__ == "__main__":
+    unittest.main()
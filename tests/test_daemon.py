@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""--daemon contre le faux serveur local : XML écrit au premier cycle et laissé intact au second
+(flux inchangé), --status-file à jour, options sans effet en mode résident refusées."""
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from support import StubApi, run_main
+import benchmark_horaire as bench
+
+ROOMS = bench.room_names(3)
+
+class DaemonTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp = Path(self._tmp.name)
+        self.mocks = self.tmp / "mocks"
+        bench.write_mock_dir(self.mocks, ROOMS, bench.DEFAULT_START, 7, 8, 21)
+        self.stub = StubApi(self.mocks).__enter__()
+        self.out = self.tmp / "daemon.xml"
+        self.status = self.tmp / "status.json"
+
+    def tearDown(self):
+        self.stub.__exit__(None, None, None)
+        self._tmp.cleanup()
+
+    def daemon(self, *extra):
+        return run_main("--daemon", "--cycles", 2, "--interval", 0.3, "--stagger", 0, "--verbose",
+                        "--salles", self.mocks / "salles.ini", "--api", self.stub.url, "--retries", 0,
+                        "--out", self.out, "--status-file", self.status,
+                        "--start", bench.DEFAULT_START.strftime("%Y%m%d"), "--days", 7, *extra)
+
+    def test_two_cycles(self):
+        self.stub.modes[ROOMS[2]] = 500
+        code, stdout, err = self.daemon()
+        self.assertEqual(code, 0, err)
+        cycles = [line for line in stdout.splitlines() if line.startswith("[daemon]") and " cycle " in line]
+        self.assertEqual(len(cycles), 2)
+        self.assertIn("cycle 1 : 2/3 salle(s) à jour, XML réécrit", cycles[0])
+        self.assertIn("cycle 2 : 2/3 salle(s) à jour, XML inchangé", cycles[1])
+        self.assertEqual(sorted(self.stub.requests), sorted(ROOMS * 2))
+
+        status = json.loads(self.status.read_text(encoding="utf-8"))
+        self.assertEqual(status["cycles"], 2)
+        self.assertEqual(status["last_cycle"]["failed"], [ROOMS[2]])
+        self.assertFalse(status["last_cycle"]["changed"])
+        self.assertEqual(list(status["rooms"]), ROOMS)
+        for room in ROOMS[:2]:
+            self.assertTrue(status["rooms"][room]["ok"])
+            self.assertGreater(status["rooms"][room]["events"], 0)
+        failed = status["rooms"][ROOMS[2]]
+        self.assertEqual((failed["ok"], failed["failures"], failed["events"]), (False, 2, 0))
+        self.assertIn("500", failed["last_error"])
+        # XML du premier cycle, pas réécrit pendant le second
+        self.assertIn(ROOMS[0].encode(), self.out.read_bytes())
+        self.assertLess(self.out.stat().st_mtime, status["last_cycle"]["started"])
+
+    def test_options_without_effect_are_rejected(self):
+        for extra in (("--workers", 4), ("--processes", 2), ("--bulk", "--mock", self.mocks / f"{ROOMS[0]}.json"),
+                      ("--incremental",), ("--deadline", 5)):
+            with self.subTest(extra=extra):
+                code, _, err = self.daemon(*extra)
+                self.assertEqual(code, 2)
+                self.assertIn(str(extra[0]), err)
+        self.assertFalse(self.out.exists())
+
+if __name__ == "__main__":
+    unittest.main()
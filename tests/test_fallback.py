@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""Repli par salle : erreur HTTP, salle bloquée (--room-timeout, --deadline), réponse périmée du cache;
+rapport ([repli] et --status-file) dans l'ordre du fichier de salles, quels que soient --workers et --processes."""
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from support import StubApi, gh, run_main
+import benchmark_horaire as bench
+
+ROOMS = bench.room_names(6)
+
+class FallbackTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls._tmp = tempfile.TemporaryDirectory()
+        cls.tmp = Path(cls._tmp.name)
+        cls.mocks = cls.tmp / "mocks"
+        bench.write_mock_dir(cls.mocks, ROOMS, bench.DEFAULT_START, 7, 6, 11)
+        cls.stub = StubApi(cls.mocks).__enter__()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.stub.__exit__(None, None, None)
+        cls._tmp.cleanup()
+
+    def setUp(self):
+        self.stub.modes.clear()
+        self.cache = Path(tempfile.mkdtemp(dir=self.tmp))
+
+    def generate(self, name, *extra):
+        self.stub.reset()
+        out, status = self.tmp / f"{name}.xml", self.tmp / f"{name}.json"
+        code, _, err = run_main("--salles", self.mocks / "salles.ini", "--api", self.stub.url, "--out", out,
+                                "--retries", 0, "--cache-dir", self.cache, "--cache-ttl", 0, "--status-file", status,
+                                "--start", bench.DEFAULT_START.strftime("%Y%m%d"), "--days", 7, *extra)
+        rooms = json.loads(status.read_text(encoding="utf-8"))["rooms"]
+        repli = [line.split(" : ")[0][len("[repli] "):] for line in err.splitlines() if line.startswith("[repli] ")]
+        return code, rooms, repli, out
+
+    def test_failures_are_reported_in_salles_order(self):
+        # salles en échec après des salles à jour, sur plusieurs salles en vol et plusieurs processus
+        self.stub.modes.update({ROOMS[4]: 500, ROOMS[1]: 404, ROOMS[5]: 503})
+        for extra in ((), ("--workers", 4), ("--workers", 4, "--processes", 2)):
+            with self.subTest(extra=extra):
+                code, rooms, repli, _ = self.generate("order", *extra)
+                self.assertEqual(code, gh.EXIT_DEGRADED)
+                self.assertEqual(list(rooms), ROOMS)
+                self.assertEqual(repli, [ROOMS[1], ROOMS[4], ROOMS[5]])
+                self.assertEqual([rooms[r]["status"] for r in ROOMS],
+                                 ["fresh", "missing", "fresh", "fresh", "missing", "missing"])
+
+    def test_stale_cache_replaces_a_failed_room(self):
+        code, _, _, out = self.generate("fresh")
+        self.assertEqual(code, 0)
+        fresh = out.read_bytes()
+        self.stub.modes[ROOMS[2]] = 500
+        code, rooms, repli, out = self.generate("stale")
+        self.assertEqual(code, gh.EXIT_DEGRADED)
+        self.assertEqual(repli, [ROOMS[2]])
+        self.assertEqual((rooms[ROOMS[2]]["status"], rooms[ROOMS[2]]["source"]), ("stale", "cache"))
+        self.assertEqual(out.read_bytes(), fresh)
+
+    def test_hung_rooms_time_out(self):
+        self.stub.modes.update({ROOMS[0]: "hang", ROOMS[3]: "hang"})
+        for extra in (("--room-timeout", 0.5), ("--deadline", 1, "--workers", 6)):
+            with self.subTest(extra=extra):
+                code, rooms, repli, _ = self.generate("hang", *extra)
+                self.assertEqual(code, gh.EXIT_DEGRADED)
+                self.assertEqual(list(rooms), ROOMS)
+                self.assertEqual(repli, [ROOMS[0], ROOMS[3]])
+                self.assertEqual(rooms[ROOMS[0]]["status"], "missing")
+                self.assertEqual(rooms[ROOMS[1]]["status"], "fresh")
+
+if __name__ == "__main__":
+    unittest.main()
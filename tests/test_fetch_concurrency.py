@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""--workers contre un faux serveur local : XML identique à l'exécution séquentielle,
+plafond --max-per-host respecté côté serveur, et gain de temps réel."""
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from support import StubApi, run_main
+import benchmark_horaire as bench
+
+DELAY = 0.05  # latence simulée de l'API par requête
+
+class FetchConcurrencyTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls._tmp = tempfile.TemporaryDirectory()
+        cls.tmp = Path(cls._tmp.name)
+        cls.mocks = cls.tmp / "mocks"
+        bench.write_mock_dir(cls.mocks, bench.room_names(12), bench.DEFAULT_START, 7, 10, 1)
+        cls.stub = StubApi(cls.mocks, delay=DELAY).__enter__()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.stub.__exit__(None, None, None)
+        cls._tmp.cleanup()
+
+    def generate(self, name, *extra):
+        out = self.tmp / name
+        self.stub.reset()
+        t0 = time.perf_counter()
+        code, _, err = run_main("--salles", self.mocks / "salles.ini", "--api", self.stub.url, "--out", out,
+                                "--start", bench.DEFAULT_START.strftime("%Y%m%d"), "--days", "7", *extra)
+        self.assertEqual(code, 0, err)
+        return out.read_bytes(), time.perf_counter() - t0
+
+    def test_workers_match_serial_and_respect_host_cap(self):
+        serial, t_serial = self.generate("serial.xml")
+        self.assertEqual(self.stub.max_inflight, 1)
+        self.assertEqual(len(self.stub.requests), 12)
+        for workers, cap in ((8, 3), (4, 4), (12, 1)):
+            with self.subTest(workers=workers, cap=cap):
+                xml, t_par = self.generate(f"w{workers}.xml", "--workers", workers, "--max-per-host", cap)
+                self.assertEqual(xml, serial)
+                self.assertEqual(sorted(self.stub.requests), sorted(bench.room_names(12)))
+                self.assertLessEqual(self.stub.max_inflight, cap)
+                if cap > 1:
+                    self.assertGreater(self.stub.max_inflight, 1)
+                    # 12 requêtes de 50 ms : au moins deux fois plus rapide qu'en séquentiel
+                    self.assertLess(t_par, t_serial / 2)
+
+if __name__ == "__main__":
+    unittest.main()
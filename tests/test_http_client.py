@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""HttpClient : redirections, proxys de l'environnement (HTTP_PROXY / HTTPS_PROXY / NO_PROXY)
+et erreurs de certificat jamais renvoyées."""
+import os
+import ssl
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from support import StubApi, gh
+import benchmark_horaire as bench
+
+ROOM = bench.room_names(1)[0]
+FORM = {"action": "getHoraireSalle", "codeSalle": ROOM}
+NO_PROXY_ENV = {k: "" for k in ("http_proxy", "https_proxy", "HTTP_PROXY", "HTTPS_PROXY", "no_proxy", "NO_PROXY")}
+
+class HttpClientTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls._tmp = tempfile.TemporaryDirectory()
+        mocks = Path(cls._tmp.name)
+        bench.write_mock_dir(mocks, [ROOM], bench.DEFAULT_START, 7, 4, 5)
+        cls.body = (mocks / f"{ROOM}.json").read_text(encoding="utf-8")
+        cls.stub = StubApi(mocks).__enter__()
+        cls.base = cls.stub.url.rsplit("/api/", 1)[0]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.stub.__exit__(None, None, None)
+        cls._tmp.cleanup()
+
+    def setUp(self):
+        self.stub.reset()
+        self.stub.redirects.clear()
+        env = mock.patch.dict(os.environ, NO_PROXY_ENV)
+        env.start()
+        self.addCleanup(env.stop)
+
+    def post(self, url, **kwargs):
+        with gh.HttpClient(retries=0, timeout=5, **kwargs) as client:
+            return client.post(url, FORM)
+
+    def test_redirects_resend_the_post(self):
+        for status in sorted(gh.REDIRECT_STATUS):
+            with self.subTest(status=status):
+                self.stub.reset()
+                self.stub.redirects["/old"] = (status, "/hop")
+                self.stub.redirects["/hop"] = (status, self.stub.url)
+                resp = self.post(self.base + "/old")
+                self.assertEqual((resp.status, resp.text), (200, self.body))
+                self.assertEqual(self.stub.requests, [ROOM])
+                self.assertTrue(all(line.startswith("POST ") for line in self.stub.lines))
+
+    def test_redirect_loop_is_bounded(self):
+        self.stub.redirects["/loop"] = (302, "/loop")
+        with self.assertRaises(gh.HttpError) as ctx:
+            self.post(self.base + "/loop")
+        self.assertIn("redirections", str(ctx.exception))
+        self.assertEqual(len(self.stub.lines), gh.MAX_REDIRECTS + 1)
+
+    def test_http_proxy_gets_absolute_url(self):
+        proxy = self.base.replace("http://", "http://user:secret@")
+        with mock.patch.dict(os.environ, {"http_proxy": proxy}):
+            resp = self.post("http://horaire.invalid/api/getHoraireSalle")
+        self.assertEqual(resp.text, self.body)
+        self.assertEqual(self.stub.lines, ["POST http://horaire.invalid/api/getHoraireSalle HTTP/1.1"])
+        self.assertEqual(self.stub.proxy_auth, ["Basic dXNlcjpzZWNyZXQ="])
+
+    def test_no_proxy_bypasses_the_proxy(self):
+        with mock.patch.dict(os.environ, {"http_proxy": "http://127.0.0.1:9", "no_proxy": "127.0.0.1"}):
+            self.assertEqual(self.post(self.stub.url).text, self.body)
+
+    def test_https_goes_through_a_connect_tunnel(self):
+        with mock.patch.dict(os.environ, {"https_proxy": self.base.replace("http://", "http://u:p@")}):
+            with self.assertRaises(gh.HttpError):  # le faux proxy refuse le tunnel (502)
+                self.post("https://horaire.invalid/api/getHoraireSalle")
+        self.assertEqual(self.stub.lines, ["CONNECT horaire.invalid:443 HTTP/1.0"])
+        self.assertEqual(self.stub.proxy_auth, ["Basic dTpw"])
+
+    def test_certificate_errors_are_not_retried(self):
+        client = gh.HttpClient(retries=3, backoff=0)
+        calls = []
+
+        def refuse(*args):
+            calls.append(args)
+            raise ssl.SSLCertVerificationError("certificate verify failed")
+
+        with mock.patch.object(client, "_send_once", refuse):
+            with self.assertRaises(gh.HttpError) as ctx:
+                client.post("https://horaire.invalid/api", FORM)
+        self.assertFalse(ctx.exception.retryable)
+        self.assertEqual(len(calls), 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""--incremental : code de sortie 0 si le XML change, 3 (EXIT_UNCHANGED) sinon; salles au flux
+inchangé réutilisées; XML inchangé jamais réécrit (date de modification conservée)."""
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from support import gh, run_main
+import benchmark_horaire as bench
+
+ROOMS = bench.room_names(5)
+
+class IncrementalTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp = Path(self._tmp.name)
+        self.mocks = self.tmp / "mocks"
+        bench.write_mock_dir(self.mocks, ROOMS, bench.DEFAULT_START, 7, 8, 5)
+        self.out = self.tmp / "horaire.xml"
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def generate(self, *extra, out=None):
+        code, stdout, err = run_main("--salles", self.mocks / "salles.ini", "--mock-dir", self.mocks,
+                                     "--out", out or self.out, "--verbose",
+                                     "--start", bench.DEFAULT_START.strftime("%Y%m%d"), "--days", "7", *extra)
+        self.assertNotIsInstance(code, str, err)
+        return code, stdout
+
+    def age_output(self):
+        """Recule la date de modification du XML : une réécriture, même dans la seconde, se voit."""
+        os.utime(self.out, ns=(10**18, 10**18))
+
+    def test_first_run_builds_everything(self):
+        code, stdout = self.generate("--incremental")
+        self.assertEqual(code, 0)
+        self.assertIn(f"[incremental] 0 salle(s) réutilisée(s), {len(ROOMS)} recalculée(s)", stdout)
+        self.assertTrue(Path(f"{self.out}.state.json").exists())
+
+    def test_identical_run_is_unchanged(self):
+        self.generate("--incremental")
+        first = self.out.read_bytes()
+        self.age_output()
+        code, stdout = self.generate("--incremental")
+        self.assertEqual(code, gh.EXIT_UNCHANGED)
+        self.assertIn(f"[incremental] {len(ROOMS)} salle(s) réutilisée(s), 0 recalculée(s)", stdout)
+        self.assertIn(f"Inchangé -> {self.out}", stdout)
+        self.assertEqual(self.out.stat().st_mtime_ns, 10**18)
+        self.assertEqual(self.out.read_bytes(), first)
+
+    def test_changed_room_is_rebuilt_alone(self):
+        self.generate("--incremental")
+        first = self.out.read_bytes()
+        other = self.tmp / "other"
+        bench.write_mock_dir(other, ROOMS[:1], bench.DEFAULT_START, 7, 8, 99)
+        (self.mocks / f"{ROOMS[0]}.json").write_bytes((other / f"{ROOMS[0]}.json").read_bytes())
+        self.age_output()
+        code, stdout = self.generate("--incremental")
+        self.assertEqual(code, 0)
+        self.assertIn(f"[incremental] {len(ROOMS) - 1} salle(s) réutilisée(s), 1 recalculée(s)", stdout)
+        self.assertNotEqual(self.out.stat().st_mtime_ns, 10**18)
+        self.assertNotEqual(self.out.read_bytes(), first)
+        # même XML qu'une génération complète
+        full = self.tmp / "full.xml"
+        self.assertEqual(self.generate(out=full)[0], 0)
+        self.assertEqual(self.out.read_bytes(), full.read_bytes())
+
+    def test_other_parameters_rebuild_everything(self):
+        self.generate("--incremental")
+        code, stdout = self.generate("--incremental", "--shift-hours", "-1")
+        self.assertIn(f"[incremental] 0 salle(s) réutilisée(s), {len(ROOMS)} recalculée(s)", stdout)
+        self.assertEqual(code, 0)
+
+if __name__ == "__main__":
+    unittest.main()
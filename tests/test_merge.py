@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""Fusion des créneaux (merge_contiguous_events) comparée à un oracle par force brute."""
+import random
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import generateur_horaire_v2 as gh  # noqa: E402
+
+E = gh.Event
+
+def oracle(evts, gap):
+    """Fusion par point fixe : deux intervalles d'un même (jour, salle, cours) fusionnent tant
+    qu'ils se touchent à `gap` minutes près. Fin < début = passage de minuit, fin == début = vide."""
+    groups = {}
+    for e in evts:
+        end = e.end + gh.DAY_MINUTES if e.end < e.start else e.end
+        groups.setdefault(e[:3], []).append([e.start, end])
+    out = []
+    for key in sorted(groups):
+        spans = groups[key]
+        changed = True
+        while changed:
+            changed = False
+            for i in range(len(spans)):
+                for j in range(i + 1, len(spans)):
+                    a, b = spans[i], spans[j]
+                    if b[0] <= a[1] + gap and a[0] <= b[1] + gap:
+                        spans[i] = [min(a[0], b[0]), max(a[1], b[1])]
+                        del spans[j]
+                        changed = True
+                        break
+                if changed:
+                    break
+        for start, end in sorted(spans):
+            out.append(E(key[0], key[1], key[2], start, end % gh.DAY_MINUTES))
+    return out
+
+class MergeTest(unittest.TestCase):
+    def test_zero_length_slot_is_not_a_full_day(self):
+        evts = [E(1, "A", "c", 600, 600), E(1, "A", "c", 660, 720), E(1, "A", "c", 900, 960)]
+        self.assertEqual(gh.merge_contiguous_events(list(evts)), evts)
+
+    def test_zero_length_slot_inside_a_course(self):
+        evts = [E(1, "A", "c", 600, 660), E(1, "A", "c", 630, 630), E(1, "A", "c", 660, 660)]
+        self.assertEqual(gh.merge_contiguous_events(evts), [E(1, "A", "c", 600, 660)])
+
+    def test_midnight_end(self):
+        evts = [E(1, "A", "c", 1380, 0), E(1, "A", "c", 1320, 1380), E(1, "A", "c", 600, 660)]
+        self.assertEqual(gh.merge_contiguous_events(evts),
+                         [E(1, "A", "c", 600, 660), E(1, "A", "c", 1320, 0)])
+
+    def test_random_days_against_oracle(self):
+        rnd = random.Random(8)
+        for _ in range(2000):
+            evts = []
+            for _ in range(rnd.randint(1, 12)):
+                start = rnd.randrange(0, gh.DAY_MINUTES, 10)
+                # vides, courts, longs, et fins à minuit ou après
+                end = rnd.choice([start, (start + rnd.choice([10, 20, 60, 120])) % gh.DAY_MINUTES,
+                                  0, rnd.randrange(0, gh.DAY_MINUTES, 10)])
+                evts.append(E(rnd.randint(1, 2), rnd.choice("AB"), rnd.choice("xy"), start, end))
+            gap = rnd.choice([0, 10, 15])
+            self.assertEqual(gh.merge_contiguous_events(list(evts), gap), oracle(evts, gap), (evts, gap))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""Occupation par créneaux de 10 minutes (room_occupancy) comparée à un oracle minute par minute."""
+import random
+import sys
+import unittest
+from datetime import date
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import generateur_horaire_v2 as gh  # noqa: E402
+
+E = gh.Event
+START = date(2026, 10, 12)
+FIRST = START.toordinal()
+
+def oracle(days, n_days, preheat, postheat):
+    occ = [0] * (n_days * gh.OCC_SLOTS)
+    for evts in days.values():
+        for e in evts:
+            end = e.end + gh.DAY_MINUTES if e.end < e.start else e.end
+            base = (e.day - FIRST) * gh.DAY_MINUTES
+            for m in range(max(0, base + e.start - preheat), min(len(occ) * gh.OCC_SLOT, base + end + postheat)):
+                occ[m // gh.OCC_SLOT] = 1
+    return occ
+
+class OccupancyTest(unittest.TestCase):
+    def test_zero_length_event_does_not_fill_the_day(self):
+        days = {FIRST: [E(FIRST, "A", "c", 600, 600)]}
+        self.assertEqual(sum(gh.room_occupancy(days, START, 1)), 0)
+        self.assertEqual(list(gh.room_occupancy(days, START, 1, 30, 10)), oracle(days, 1, 30, 10))
+
+    def test_margins_across_midnight(self):
+        days = {FIRST + 1: [E(FIRST + 1, "A", "c", 10, 60)], FIRST + 2: [E(FIRST + 2, "A", "c", 1400, 30)]}
+        self.assertEqual(list(gh.room_occupancy(days, START, 4, 30, 20)), oracle(days, 4, 30, 20))
+
+    def test_random_rooms_against_oracle(self):
+        rnd = random.Random(21)
+        for _ in range(300):
+            n_days = rnd.randint(1, 4)
+            days = {}
+            for _ in range(rnd.randint(0, 8)):
+                day = FIRST + rnd.randrange(n_days)
+                start = rnd.randrange(0, gh.DAY_MINUTES, 5)
+                end = rnd.choice([start, 0, (start + rnd.choice([5, 50, 90])) % gh.DAY_MINUTES])
+                days.setdefault(day, []).append(E(day, "A", "c", start, end))
+            pre, post = rnd.choice([(0, 0), (30, 15), (7, 3)])
+            slots = gh.room_occupancy(days, START, n_days, pre, post)
+            occ = oracle(days, n_days, pre, post)
+            self.assertEqual(list(slots), occ)
+            for i in range(n_days):
+                day = occ[i * gh.OCC_SLOTS:(i + 1) * gh.OCC_SLOTS]
+                self.assertEqual(sum(b - a for a, b in gh.occupied_intervals(slots, i)), sum(day))
+                self.assertEqual(gh.day_mask(slots, i), int("".join(map(str, day)), 2))
+
+if __name__ == "__main__":
+    unittest.main()
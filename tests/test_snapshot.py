@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""Instantané binaire : XML identique au flux d'origine, refus des fichiers tronqués ou corrompus,
+cohérence du filtrage par salle, salles absentes de l'instantané et --snapshot-out refusé en --daemon."""
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from support import gh, run_main
+import benchmark_horaire as bench
+
+def run(*argv):
+    code, _, err = run_main(*argv)
+    return code, err
+
+class SnapshotTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls._tmp = tempfile.TemporaryDirectory()
+        cls.tmp = Path(cls._tmp.name)
+        cls.mocks = cls.tmp / "mocks"
+        cls.rooms = bench.room_names(4)
+        bench.write_mock_dir(cls.mocks, cls.rooms, bench.DEFAULT_START, 14, 12, 17)
+        cls.window = ["--start", bench.DEFAULT_START.strftime("%Y%m%d"), "--days", "14"]
+        cls.snap = cls.tmp / "horaire.snap"
+        cls.live = cls.tmp / "live.xml"
+        code, _ = run("--salles", cls.mocks / "salles.ini", "--mock-dir", cls.mocks, "--out", cls.live,
+                      "--snapshot-out", cls.snap, *cls.window)
+        assert code == 0
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._tmp.cleanup()
+
+    def test_same_xml_as_live_feed(self):
+        out = self.tmp / "snap.xml"
+        self.assertEqual(run("--snapshot-in", self.snap, "--out", out, *self.window)[0], 0)
+        self.assertEqual(out.read_bytes(), self.live.read_bytes())
+
+    def test_truncated_and_corrupted_are_rejected(self):
+        data = self.snap.read_bytes()
+        bad = self.tmp / "bad.snap"
+        for blob, reason in ((data[:len(data) // 2], "tronqué"), (data[:10], "tronqué"),
+                             (data[:-1] + bytes([data[-1] ^ 1]), "CRC")):
+            bad.write_bytes(blob)
+            code, _ = run("--snapshot-in", bad, "--out", self.tmp / "bad.xml", *self.window)
+            self.assertIsInstance(code, str)
+            self.assertIn(reason, code)
+        self.assertFalse((self.tmp / "bad.xml").exists())
+
+    def test_filter_location_mismatch_is_rejected(self):
+        code, err = run("--snapshot-in", self.snap, "--out", self.tmp / "nf.xml", "--no-filter-location", *self.window)
+        self.assertEqual(code, 2)
+        self.assertIn("--no-filter-location", err)
+
+    def test_room_missing_from_snapshot(self):
+        ini = self.tmp / "extra.ini"
+        ini.write_text(f"s1={self.rooms[0]}\ns2=IV-INCONNUE\n", encoding="utf-8")
+        status = self.tmp / "status.json"
+        code, err = run("--salles", ini, "--snapshot-in", self.snap, "--out", self.tmp / "extra.xml",
+                        "--status-file", status, *self.window)
+        self.assertEqual(code, gh.EXIT_DEGRADED)
+        self.assertIn("[repli] IV-INCONNUE", err)
+        rooms = json.loads(status.read_text(encoding="utf-8"))["rooms"]
+        self.assertEqual(rooms[self.rooms[0]]["status"], "fresh")
+        self.assertEqual(rooms["IV-INCONNUE"]["status"], "missing")
+
+    def test_daemon_rejects_snapshot_out(self):
+        snap = self.tmp / "daemon.snap"
+        code, err = run("--daemon", "--cycles", "1", "--salles", self.mocks / "salles.ini", "--mock-dir", self.mocks,
+                        "--out", self.tmp / "daemon.xml", "--snapshot-out", snap, *self.window)
+        self.assertEqual(code, 2)
+        self.assertIn("--snapshot-out", err)
+        self.assertFalse(snap.exists())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""Démarrage à froid (check_startup.py) : modules LAZY jamais chargés par l'import, aucun module de
+FORBIDDEN_MOCK pour une génération depuis des mocks, budget d'import respecté (ignoré si la mesure est bruitée)."""
+import contextlib
+import io
+import unittest
+
+import support  # noqa: F401  (racine du dépôt dans sys.path)
+import check_startup
+
+class StartupTest(unittest.TestCase):
+    def test_import_loads_no_lazy_module(self):
+        _, loaded = check_startup.measure_import(1)
+        self.assertTrue(loaded, "import du module non mesuré")
+        self.assertEqual([m for m in check_startup.LAZY if m in loaded], [])
+
+    def test_mock_run_imports_nothing_forbidden(self):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            ok = check_startup.check_mock_run()
+        self.assertTrue(ok, out.getvalue())
+
+    def test_gui_opens_without_the_generator(self):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            ok = check_startup.check_gui()
+        self.assertTrue(ok, out.getvalue())
+
+    def test_import_budget(self):
+        total_ms, _ = check_startup.measure_import(5)
+        if total_ms > check_startup.DEFAULT_BUDGET_MS:
+            # machine chargée : une seconde série tranche avant de conclure au bruit
+            total_ms = min(total_ms, check_startup.measure_import(10)[0])
+        if total_ms > check_startup.DEFAULT_BUDGET_MS:
+            self.skipTest(f"import {total_ms:.1f} ms > {check_startup.DEFAULT_BUDGET_MS:.0f} ms "
+                          "(mesure bruitée ? relancer python check_startup.py)")
+
+if __name__ == "__main__":
+    unittest.main()
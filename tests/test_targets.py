@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""Fichier de salles : à plat, à une section (en-tête .ini classique) ou en plusieurs cibles."""
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import generateur_horaire_v2 as gh  # noqa: E402
+
+class TargetsTest(unittest.TestCase):
+    def load(self, text):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "salles.ini"
+            path.write_text(text, encoding="utf-8")
+            return gh.load_targets_ini(str(path)), gh.load_salles_ini(str(path))
+
+    def test_flat_file(self):
+        targets, salles = self.load("#commentaire\nsalle01=IV-E202\nsalle02=IV-E203\n")
+        self.assertEqual(targets, {"": ["IV-E202", "IV-E203"]})
+        self.assertEqual(salles, ["IV-E202", "IV-E203"])
+        self.assertIsNone(gh.check_targets(targets, "Horaire.xml"))
+        self.assertIsNotNone(gh.check_targets(targets, "Horaire_{target}.xml"))
+
+    def test_single_section_writes_to_out(self):
+        targets, salles = self.load("[salles]\ns1=IV-E202\ns2=IV-E203\n")
+        self.assertEqual(salles, ["IV-E202", "IV-E203"])
+        self.assertIsNone(gh.check_targets(targets, "Horaire.xml"))
+        self.assertEqual(gh.target_path("Horaire.xml", "salles"), Path("Horaire.xml"))
+        self.assertIsNone(gh.check_targets(targets, "Horaire_{target}.xml"))
+
+    def test_several_sections_need_target(self):
+        targets, salles = self.load("[A]\ns1=IV-E202\ns2=IV-E203\n[B]\ns1=IV-E203\n")
+        self.assertEqual(targets, {"A": ["IV-E202", "IV-E203"], "B": ["IV-E203"]})
+        self.assertEqual(salles, ["IV-E202", "IV-E203"])
+        self.assertIsNotNone(gh.check_targets(targets, "Horaire.xml"))
+        self.assertIsNone(gh.check_targets(targets, "Horaire_{target}.xml"))
+
+    def test_rooms_before_first_section(self):
+        with self.assertRaises(ValueError):
+            self.load("s0=IV-E106\n[A]\ns1=IV-E202\n")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""Fenêtre de dates : le pré-filtre du décodage en flux (FeedItemFilter) et l'instantané gardent
+exactement les créneaux que garderait la liste complète, quel que soit --shift-hours."""
+import io
+import json
+import random
+import tempfile
+import unittest
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+from support import gh
+
+START, END = date(2026, 10, 17), date(2026, 10, 18)
+
+def random_feed(rnd, n=400):
+    """Créneaux UTC autour de la fenêtre (±3 jours), toutes heures, heure d'été et d'hiver."""
+    base = datetime(2026, 10, 14, tzinfo=timezone.utc)
+    feed = []
+    for _ in range(n):
+        t = base + timedelta(minutes=10 * rnd.randrange(8 * 144))
+        feed.append({"dtstart": t.strftime("%Y%m%dT%H%M%SZ"),
+                     "dtend": (t + timedelta(minutes=10)).strftime("%Y%m%dT%H%M%SZ"),
+                     "location": "IV-E202", "summary": "Cours"})
+    return feed
+
+class WindowTest(unittest.TestCase):
+    def test_stream_prefilter_matches_plain_list(self):
+        rnd = random.Random(6)
+        feed = random_feed(rnd)
+        feed.append({"dtstart": "20261016T230000Z", "dtend": "20261016T231000Z",
+                     "location": "IV-E202", "summary": "Cours"})
+        struct = {"horaire": {"ICAL": json.dumps({"feed": feed})}}
+        for shift in range(-49, 50):
+            with self.subTest(shift=shift):
+                flt = gh.FeedItemFilter(None, START, END, shift)
+                streamed = gh.events_from_feed(gh.iter_feed(struct, flt), None, START, END, shift)
+                plain = gh.events_from_feed(feed, None, START, END, shift)
+                self.assertEqual(sorted(streamed), sorted(plain))
+
+    def test_snapshot_matches_plain_list(self):
+        feed = random_feed(random.Random(7))
+        writer = gh.SnapshotWriter()
+        writer.add_room("IV-E202", {"horaire": {"ICAL": json.dumps({"feed": feed})}})
+        buf = io.BytesIO()
+        writer.write(buf)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "s.snap"
+            path.write_bytes(buf.getvalue())
+            snap = gh.Snapshot(str(path))
+            try:
+                for shift in (-26, -23, -2, 0, 21, 22, 23, 26):
+                    with self.subTest(shift=shift):
+                        plain = gh.merged_events_by_date(gh.events_from_feed(feed, "IV-E202", START, END, shift))
+                        self.assertEqual(snap.room_days("IV-E202", START, END, shift), plain)
+            finally:
+                snap.close()
+
+if __name__ == "__main__":
+    unittest.main()
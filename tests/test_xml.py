@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""write_xml : l'exemple Horaire2_.xml réécrit à l'identique (LF et CRLF), et textes échappés
+comme ElementTree (&, <, >) sans casser le XML."""
+import io
+import unittest
+from datetime import datetime
+from xml.etree import ElementTree as ET
+
+from support import ROOT, gh
+
+SAMPLE = ROOT / "Horaire2_.xml"
+
+def minutes(hhmm):
+    return int(hhmm[:2]) * 60 + int(hhmm[2:])
+
+def sample_events():
+    """Événements de l'exemple, par ordinal de jour, dans l'ordre du fichier."""
+    by_day = {}
+    for day in ET.parse(SAMPLE).getroot():
+        ordinal = datetime.strptime(day.findtext("dDate"), "%Y%m%d").date().toordinal()
+        by_day[ordinal] = [gh.Event(ordinal, t.findtext("LOCATION"), t.findtext("SUMMARY"),
+                                    minutes(t.findtext("TimeSTART")), minutes(t.findtext("TimeEND")))
+                           for t in day.iter("tNBEvent")]
+    return by_day
+
+def render(events_by_date, eol="\n"):
+    buf = io.BytesIO()
+    gh.write_xml(buf, events_by_date, eol)
+    return buf.getvalue()
+
+class WriteXmlTest(unittest.TestCase):
+    def test_sample_is_reproduced_byte_for_byte(self):
+        sample = SAMPLE.read_bytes()  # fins de ligne LF
+        events = sample_events()
+        self.assertGreater(sum(map(len, events.values())), 0)
+        self.assertEqual(render(events), sample)
+        self.assertEqual(render(events, "\r\n"), sample.replace(b"\n", b"\r\n"))
+
+    def test_special_characters_are_escaped_like_elementtree(self):
+        day = datetime(2026, 10, 12).toordinal()
+        texts = [("IV-E1 & <Labo>", 'R&D <"atelier"> - A > B'), ('"A&B"', "&amp; déjà échappé"), ("", "")]
+        events = {day: [gh.Event(day, loc, summary, 480, 600) for loc, summary in texts]}
+        out = render(events)
+        root = ET.fromstring(out)  # bien formé
+        parsed = [(t.findtext("LOCATION"), t.findtext("SUMMARY")) for t in root.iter("tNBEvent")]
+        self.assertEqual(parsed, texts)
+        lines = out.decode("utf-8").splitlines()
+        for i, (loc, summary) in enumerate(texts):
+            t = ET.Element("tNBEvent", index=str(i))
+            for tag, text in (("LOCATION", loc), ("TimeSTART", "0800"), ("TimeEND", "1000"), ("SUMMARY", summary)):
+                ET.SubElement(t, tag).text = text
+            self.assertEqual(lines[3 + i], ET.tostring(t, encoding="unicode", short_empty_elements=False))
+
+if __name__ == "__main__":
+    unittest.main()